@@ -1,23 +1,62 @@
 import unittest
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aoc import inputs
 
 def fuelrequired(mass):
     return (mass // 3) -2
 
+def read_masses(path, chunk_size = 1 << 20):
+    '''Reads the manifest in chunks of roughly chunk_size bytes and yields the masses in each chunk as an array'''
+    with open(path) as input:
+        rest = ''
+        while True:
+            chunk = input.read(chunk_size)
+            if not chunk:
+                break
+            # don't cut a mass in half, the part after the last newline goes with the next chunk
+            chunk = rest + chunk
+            end = chunk.rfind('\n') + 1
+            rest = chunk[end:]
+            if end:
+                yield np.fromstring(chunk[:end], dtype=np.int64, sep=' ')
+        if rest.strip():
+            yield np.fromstring(rest, dtype=np.int64, sep=' ')
+
+def fuel_totals(chunks):
+    '''Returns the fuel required and the real fuel required (including fuel for the fuel) for all masses'''
+    total = 0
+    real_total = 0
+    for masses in chunks:
+        fuel = masses // 3 - 2
+        total += int(fuel.sum())
+        while fuel.size:
+            fuel = fuel[fuel > 0]
+            real_total += int(fuel.sum())
+            fuel = fuel // 3 - 2
+    return total, real_total
+
+def manifest_fuel(path, use_cache = False):
+    '''fuel_totals for a manifest file. We stream it, so memory use doesn't depend on the size of the manifest. With
+    use_cache the masses are parsed in one go and kept in the input cache, which is only worth it for files that
+    fit in memory and that we read again and again'''
+    if use_cache:
+        return fuel_totals([inputs.load_masses(path)])
+    return fuel_totals(read_masses(path))
+
 def puzzle1():
-    with open('input1.txt') as input:
-        masses = (int(line) for line in input.readlines())
-        fuel = sum(fuelrequired(mass) for mass in masses)
-        print(F'Total fuel required: {fuel}')
+    fuel, _ = manifest_fuel('input1.txt')
+    print(F'Total fuel required: {fuel}')
 
 def realrequiredfuel(mass):
     fuel = fuelrequired(mass)
     return 0 if fuel <= 0 else fuel + realrequiredfuel(fuel)
 
 def puzzle2():
-    with open('input1.txt') as input:
-        masses = (int(line) for line in input.readlines())
-        fuel = sum(realrequiredfuel(mass) for mass in masses)
-        print(F'Real total fuel required: {fuel}')
+    _, fuel = manifest_fuel('input1.txt')
+    print(F'Real total fuel required: {fuel}')
 
 class TestPuzzle(unittest.TestCase):
     def test_puzzle1(self):
@@ -39,6 +78,21 @@ class TestPuzzle(unittest.TestCase):
         self.assertEqual(realrequiredfuel(1969), 966)
         self.assertEqual(realrequiredfuel(100756), 50346)
 
+    def test_fuel_totals(self):
+        self.assertEqual(fuel_totals([np.array([12, 14, 1969]), np.array([100756])]), (2 + 2 + 654 + 33583, 2 + 2 + 966 + 50346))
+
+    def test_read_masses(self):
+        with open('input1.txt') as input:
+            masses = [int(line) for line in input.readlines()]
+        # a small chunk size makes sure masses get split over chunks
+        chunks = list(read_masses('input1.txt', 7))
+        self.assertEqual(np.concatenate(chunks).tolist(), masses)
+        self.assertEqual(fuel_totals(chunks), (sum(fuelrequired(mass) for mass in masses), sum(realrequiredfuel(mass) for mass in masses)))
+
+    def test_manifest_fuel(self):
+        self.assertEqual(manifest_fuel('input1.txt'), (3282935, 4921542))
+        self.assertEqual(manifest_fuel('input1.txt', use_cache=True), (3282935, 4921542))
+
 if __name__ == '__main__':
     puzzle1()
     puzzle2()
\ No newline at end of file
@@ -0,0 +1,260 @@
+'''One command line for all days:
+
+    python -m aoc run day7 --part 2 --input path/to/input.txt --engine fast --time
+    python -m aoc list
+
+Every day is described by a Day: where its module lives, its default input and three stages. parse turns the text of
+the input into what the day works on, setup imports the day module and builds anything both parts share, and solve
+computes the answer for one part. With --time we print how long every stage took. Nothing is imported until a stage
+needs it, so running one day doesn't pay for numpy or the modules of the other days.'''
+import argparse
+import collections
+import importlib
+import io
+import os
+import sys
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Day = collections.namedtuple('Day', 'directory module input parse setup solve engines')
+
+def import_day(directory, module):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+def parse_program(text):
+    return [int(n) for n in text.strip().split(',')]
+
+def parse_range(text):
+    bounds = text.strip().split('-')
+    if len(bounds) != 2 or not all(bound.isdigit() for bound in bounds):
+        raise ValueError(F"{text!r} is not a range like {DAY4_RANGE}")
+    return int(bounds[0]), int(bounds[1])
+
+def _intcode_engine(engine):
+    '''The day9 engine called engine'''
+    if engine == 'reference':
+        return import_day('day9', 'day9').IntcodeProcessor
+    fastprocessor = import_day('day9', 'fastprocessor')
+    return {'fast': fastprocessor.FastIntcodeProcessor, 'fused': fastprocessor.FusingIntcodeProcessor}[engine]
+
+def _run_intcode(engine, program, input):
+    processor = _intcode_engine(engine)(program + [0] * 10**3, [input])
+    status = processor.Process()
+    assert status == 'HALT', F"The program stopped with {status}"
+    return processor.state.output[-1]
+
+def _day2(module, program, engine):
+    if engine == 'reference':
+        return lambda part: module.gravity_assist(program, 12, 2) if part == 1 else module.find_noun_verb(program)
+    # one processor for all the runs, reset copies the program into its memory
+    processor = _intcode_engine(engine)([])
+
+    def gravity_assist(noun, verb):
+        processor.reset(program)
+        processor.state.memory[1:3] = [noun, verb]
+        status = processor.Process()
+        assert status == 'HALT', F"The program stopped with {status}"
+        return processor.state.memory[0]
+
+    def solve(part):
+        if part == 1:
+            return gravity_assist(12, 2)
+        return next((100 * noun + verb for noun in range(100) for verb in range(100) if gravity_assist(noun, verb) == 19690720), None)
+    return solve
+
+def _day1(text):
+    return importlib.import_module('aoc.inputs').parse_masses(text)['masses']
+
+def _day3(module, wires, engine):
+    return [module.wire_to_lines(*wire) for wire in wires]
+
+def _day3_parse(text):
+    arrays = importlib.import_module('aoc.inputs').parse_wire_paths(text)
+    return [(arrays[F'directions{n}'], arrays[F'lengths{n}']) for n in range(len(arrays) // 2)]
+
+def _day5(module, program, engine):
+    if engine != 'reference':
+        return lambda part: _run_intcode(engine, program, [1, 5][part - 1])
+
+    def solve(part):
+        # day 5 has its own processor, which reads its input from a stream
+        output = io.BytesIO()
+        module.run([n for n in program], module.StreamIO(io.BytesIO(str([1, 5][part - 1]).encode('ascii')), output))
+        return int(output.getvalue().split()[-1])
+    return solve
+
+def _day7(module, program, engine):
+    if engine == 'reference':
+        def solve(part):
+            if part == 1:
+                return max(module.run_amplifier_series(program, phases) for phases in module.permutations(list(range(5))))
+            return max(module.run_amplifier_series_loop(program, phases) for phases in module.permutations([5, 6, 7, 8, 9]))
+        return solve
+
+    # the day9 engines return 'INPUT' when they need the next signal, so the feedback loop is just going round
+    amplifiers = [_intcode_engine(engine)([]) for _ in range(5)]
+
+    def run_amplifiers(phases):
+        for amplifier, phase in zip(amplifiers, phases):
+            amplifier.reset(program, [phase])
+        signal = 0
+        while True:
+            for amplifier in amplifiers:
+                amplifier.state.input.append(signal)
+                status = amplifier.Process()
+                assert status in ('HALT', 'INPUT') and amplifier.state.output, F"The amplifier stopped with {status}"
+                signal = amplifier.state.output[-1]
+                amplifier.state.output = []
+            if status == 'HALT':
+                return signal
+
+    def solve(part):
+        return max(run_amplifiers(phases) for phases in module.permutations(list(range(5)) if part == 1 else [5, 6, 7, 8, 9]))
+    return solve
+
+DAYS = {
+    'day1': Day('Day1', 'day1', 'input1.txt', _day1,
+                lambda module, masses, engine: module.fuel_totals([masses]),
+                lambda module, totals, part: totals[part - 1], None),
+    'day2': Day('day2', 'day2', 'input.txt', parse_program, _day2,
+                lambda module, solve, part: solve(part), ('reference', 'fast', 'fused')),
+    'day3': Day('day3', 'day3', 'input.txt', _day3_parse, _day3,
+                lambda module, lines, part: (module.min_cross_distance if part == 1 else module.min_cross_steps)(*lines), None),
+    'day4': Day('day4', 'day4', None, parse_range,
+                lambda module, bounds, engine: bounds,
+                lambda module, bounds, part: module.count_valid(*bounds, part == 2), None),
+    'day5': Day('day5', 'day5', 'input.txt', parse_program, _day5,
+                lambda module, solve, part: solve(part), ('reference', 'fast', 'fused')),
+    'day6': Day('day6', 'day6', 'input.txt', lambda text: text.splitlines(),
+                lambda module, lines, engine: module.CompactOrbitGraph(lines),
+                lambda module, graph, part: graph.total_orbits() if part == 1 else module.transfers_to_santa(graph), None),
+    'day7': Day('day7', 'day7', 'input.txt', parse_program, _day7,
+                lambda module, solve, part: solve(part), ('reference', 'fast', 'fused')),
+    'day8': Day('day8', 'day8', 'input.txt', lambda text: text.strip(),
+                lambda module, digits, engine: module.decode_image(digits, 25, 6),
+                lambda module, layers, part: module.checksum(module.layer_statistics(layers)) if part == 1 else '\n' + module.render(module.composite(layers)), None),
+    'day9': Day('day9', 'day9', 'input.txt', parse_program,
+                lambda module, program, engine: (program, engine),
+                lambda module, setup, part: _run_intcode(setup[1], setup[0], part), ('reference', 'fast', 'fused')),
+}
+
+# the input of day 4 is a range, not a file
+DAY4_RANGE = '172851-675869'
+
+def run_day(name, parts = (1, 2), input = None, engine = 'reference'):
+    '''Returns the answers for parts and how long every stage took in seconds. Raises ValueError for a day or engine
+    we don't have, or an input we can't read'''
+    if name not in DAYS:
+        raise ValueError(F"Unknown day {name}, we have {', '.join(DAYS)}")
+    day = DAYS[name]
+    if engine != 'reference' and not (day.engines and engine in day.engines):
+        raise ValueError(F"{name} can't run on the {engine} engine")
+    timings = collections.OrderedDict()
+
+    start = time.perf_counter()
+    if day.input is None:
+        text = input if input is not None else DAY4_RANGE
+    else:
+        with open(input if input is not None else os.path.join(ROOT, day.directory, day.input)) as f:
+            text = f.read()
+    parsed = day.parse(text)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    module = import_day(day.directory, day.module)
+    state = day.setup(module, parsed, engine)
+    timings['setup'] = time.perf_counter() - start
+
+    answers = []
+    for part in parts:
+        start = time.perf_counter()
+        answers.append(day.solve(module, state, part))
+        timings[F'solve part {part}'] = time.perf_counter() - start
+    return answers, timings
+
+def format_timings(timings):
+    return ', '.join(F"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items())
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(prog='python -m aoc', description="Advent of code 2019")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_command = commands.add_parser('run', help="solve a day")
+    run_command.add_argument('day', choices=list(DAYS))
+    run_command.add_argument('--part', type=int, choices=[1, 2], help="only solve this part")
+    run_command.add_argument('--input', help="the input file, or the range for day4")
+    run_command.add_argument('--engine', default='reference', choices=['reference', 'fast', 'fused'], help="the Intcode engine, for day2, day5, day7 and day9")
+    run_command.add_argument('--time', action='store_true', help="print how long parsing, setup and solving took")
+    commands.add_parser('list', help="list the days we can run")
+    args = parser.parse_args(arguments)
+
+    if args.command == 'list':
+        for name, day in DAYS.items():
+            print(name + (F" (engines: {', '.join(day.engines)})" if day.engines else ''))
+        return
+
+    parts = (args.part,) if args.part else (1, 2)
+    try:
+        answers, timings = run_day(args.day, parts, args.input, args.engine)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    for part, answer in zip(parts, answers):
+        print(F"{args.day} part {part}: {answer}")
+    if args.time:
+        print(format_timings(timings), file=sys.stderr)
+
+class CommandLineTests(unittest.TestCase):
+    def test_days(self):
+        self.assertEqual(run_day('day1')[0], [3282935, 4921542])
+        self.assertEqual(run_day('day6')[0], [294191, 424])
+        self.assertEqual(run_day('day3')[0], [1264, 37390])
+        self.assertEqual(run_day('day2', (1,))[0], [6627023])
+        self.assertEqual(run_day('day8', (1,))[0], [2562])
+
+    def test_engines(self):
+        for engine in ('reference', 'fast', 'fused'):
+            self.assertEqual(run_day('day9', input=os.path.join(ROOT, 'day9', 'input.txt'), engine=engine)[0], [2890527621, 66772])
+            self.assertEqual(run_day('day5', engine=engine)[0], [9219874, 5893654])
+        for engine in ('reference', 'fast', 'fused'):
+            self.assertEqual(run_day('day7', engine=engine)[0], [272368, 19741286])
+            self.assertEqual(run_day('day2', engine=engine)[0], [6627023, 4019])
+        with self.assertRaises(ValueError):
+            run_day('day4', engine='fast')
+
+    def test_timings(self):
+        answers, timings = run_day('day4', (1,), '111110-111125')
+        # 111111 up to 111119 and 111122 up to 111125
+        self.assertEqual(answers, [13])
+        self.assertEqual(list(timings), ['parse', 'setup', 'solve part 1'])
+        self.assertIn('solve part 1', format_timings(timings))
+
+    def test_lazy_imports(self):
+        import subprocess
+        code = "import sys; import aoc.cli; print('numpy' in sys.modules, 'day9' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), 'False False')
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            run_day('day4', input='foo')
+        error = io.StringIO()
+        sys.stderr, stderr = error, sys.stderr
+        try:
+            with self.assertRaises(SystemExit):
+                main(['run', 'day4', '--input', 'foo'])
+        finally:
+            sys.stderr = stderr
+        self.assertIn("'foo' is not a range", error.getvalue())
+
+    def test_main(self):
+        output = io.StringIO()
+        sys.stdout, stdout = output, sys.stdout
+        try:
+            main(['run', 'day9', '--part', '1', '--engine', 'fast'])
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(output.getvalue(), "day9 part 1: 2890527621\n")
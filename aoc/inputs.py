@@ -0,0 +1,91 @@
+'''Loaders for the line based puzzle inputs. They parse a file with bulk numpy operations instead of a python loop
+per line, and keep the parsed arrays in a binary cache next to the repository, keyed by the hash of the file
+contents. So the second time we load the same input we just read back a couple of arrays.'''
+import hashlib
+import os
+import unittest
+import numpy as np
+
+CACHE_DIR = os.environ.get('AOC_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.aoc_cache'))
+# bump this when the format of what the parsers return changes, so old cache entries are ignored
+CACHE_VERSION = 1
+
+def load(path, kind, parser, use_cache = True):
+    '''Returns parser(text) as a dict of arrays, from the cache if we have seen this content before'''
+    with open(path, 'rb') as f:
+        content = f.read()
+    if not use_cache:
+        return parser(content.decode('ascii'))
+
+    key = hashlib.sha256(content).hexdigest()
+    cache_file = os.path.join(CACHE_DIR, F"{kind}-{CACHE_VERSION}-{key}.npz")
+    if os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            return {name: cached[name] for name in cached.files}
+
+    arrays = parser(content.decode('ascii'))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # write to a temporary file first, so a concurrent reader never sees half a cache entry
+    temporary = F"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, cache_file)
+    return arrays
+
+def parse_masses(text):
+    return {'masses': np.fromstring(text, dtype=np.int64, sep=' ')}
+
+def load_masses(path, use_cache = True):
+    '''day 1: one mass per line'''
+    return load(path, 'masses', parse_masses, use_cache)['masses']
+
+WIRE_SEPARATORS = str.maketrans('UDLR,', '     ')
+
+def parse_wire_paths(text):
+    arrays = {}
+    for n, line in enumerate(l for l in text.splitlines() if l.strip()):
+        line = line.strip()
+        characters = np.frombuffer(line.encode('ascii'), dtype=np.uint8)
+        # every step starts with its direction, at the start of the line and right after a comma
+        starts = np.concatenate(([0], np.flatnonzero(characters == ord(',')) + 1))
+        arrays[F'directions{n}'] = characters[starts]
+        arrays[F'lengths{n}'] = np.fromstring(line.translate(WIRE_SEPARATORS), dtype=np.int64, sep=' ')
+    return arrays
+
+def load_wire_paths(path, use_cache = True):
+    '''day 3: one wire per line, as a list of (directions, lengths). Directions are the ascii codes of U, D, L and R'''
+    arrays = load(path, 'wires', parse_wire_paths, use_cache)
+    return [(arrays[F'directions{n}'], arrays[F'lengths{n}']) for n in range(len(arrays) // 2)]
+
+def parse_orbit_edges(text):
+    bodies = np.array(text.replace(')', ' ').split())
+    names, ids = np.unique(bodies, return_inverse=True)
+    return {'names': names, 'edges': ids.astype(np.int64).reshape(-1, 2)}
+
+def load_orbit_edges(path, use_cache = True):
+    '''day 6: one orbitee)orbiter per line. Returns the interned body names and an (edges, 2) array of
+    (orbitee, orbiter) ids into those names'''
+    arrays = load(path, 'orbits', parse_orbit_edges, use_cache)
+    return arrays['names'].tolist(), arrays['edges']
+
+class InputTests(unittest.TestCase):
+    def test_parse_masses(self):
+        self.assertEqual(parse_masses("12\n14\n1969\n")['masses'].tolist(), [12, 14, 1969])
+
+    def test_parse_wire_paths(self):
+        arrays = parse_wire_paths("R8,U5,L5,D3\nU7,R6,D4,L4\n")
+        self.assertEqual(bytes(arrays['directions0']), b'RULD')
+        self.assertEqual(arrays['lengths0'].tolist(), [8, 5, 5, 3])
+        self.assertEqual(bytes(arrays['directions1']), b'URDL')
+        self.assertEqual(arrays['lengths1'].tolist(), [7, 6, 4, 4])
+
+    def test_parse_orbit_edges(self):
+        arrays = parse_orbit_edges("COM)B\nB)C\nB)G\n")
+        names = arrays['names'].tolist()
+        self.assertEqual([(names[a], names[b]) for a, b in arrays['edges']], [("COM", "B"), ("B", "C"), ("B", "G")])
+
+    def test_cache(self):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Day1', 'input1.txt')
+        parsed = load_masses(path, use_cache=False)
+        self.assertEqual(load_masses(path).tolist(), parsed.tolist())
+        # the second load comes from the cache
+        self.assertEqual(load_masses(path).tolist(), parsed.tolist())
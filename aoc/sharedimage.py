@@ -0,0 +1,123 @@
+'''Program images in shared memory. The parent puts the program in shared memory once, and worker processes attach to
+it by name instead of getting their own pickled copy with every task. Every run gets a CopyOnWriteMemory on top of the
+shared image, which only stores the cells that run writes to, so starting a run doesn't depend on the program size.'''
+import multiprocessing
+import unittest
+from multiprocessing import shared_memory
+
+class CopyOnWriteMemory:
+    '''Reads come from the shared image unless we wrote to that address ourselves'''
+    __slots__ = ('_base', '_written')
+
+    def __init__(self, base):
+        self._base = base
+        self._written = {}
+
+    def __len__(self):
+        return len(self._base)
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            return [self[a] for a in range(*address.indices(len(self._base)))]
+        if address < 0:
+            address += len(self._base)
+            if address < 0:
+                raise IndexError(F"Can't access location {address - len(self._base)} in memory with size {len(self._base)}")
+        value = self._written.get(address)
+        if value is None:
+            return self._base[address]
+        return value
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            address += len(self._base)
+        if not 0 <= address < len(self._base):
+            raise IndexError(F"Can't access location {address} in memory with size {len(self._base)}")
+        self._written[address] = value
+
+    def written(self):
+        return dict(self._written)
+
+class SharedProgramImage:
+    def __init__(self, memory, length, owner):
+        self._memory = memory
+        self._length = length
+        self._owner = owner
+        self._cells = memory.buf.cast('q')[:length]
+
+    @classmethod
+    def create(cls, program):
+        '''Puts program in a new block of shared memory, as 64 bit integers'''
+        assert all(-2**63 <= value < 2**63 for value in program), "The program doesn't fit in 64 bit integers"
+        memory = shared_memory.SharedMemory(create=True, size=max(1, 8 * len(program)))
+        image = cls(memory, len(program), True)
+        for address, value in enumerate(program):
+            image._cells[address] = value
+        return image
+
+    @classmethod
+    def attach(cls, name, length):
+        '''Attach to an image created by a parent process. Only the creator removes it again'''
+        return cls(shared_memory.SharedMemory(name=name), length, False)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def __len__(self):
+        return self._length
+
+    def memory(self):
+        '''A private view of the program for one run'''
+        return CopyOnWriteMemory(self._cells)
+
+    def close(self):
+        self._cells.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+# the image this worker process attached to in attach_worker
+worker_image = None
+
+def attach_worker(name, length):
+    '''Initializer for a multiprocessing.Pool, so every worker attaches to the image once'''
+    global worker_image
+    worker_image = SharedProgramImage.attach(name, length)
+
+def _write_and_read(addresses):
+    memory = worker_image.memory()
+    memory[addresses[0]] = -1
+    return [memory[a] for a in addresses], len(memory.written())
+
+class SharedProgramImageTests(unittest.TestCase):
+    def test_copy_on_write(self):
+        with SharedProgramImage.create([1, 2, 3, 2**62]) as image:
+            first, second = image.memory(), image.memory()
+            first[1] = 20
+            first[-1] = 40
+            self.assertEqual(first[0:4], [1, 20, 3, 40])
+            self.assertEqual((first[-1], first[3], first[-3]), (40, 40, 20))
+            self.assertEqual(second[-1], 2**62)
+            self.assertEqual(second[0:4], [1, 2, 3, 2**62])
+            self.assertEqual(first.written(), {1: 20, 3: 40})
+            with self.assertRaises(IndexError):
+                first[4] = 0
+            with self.assertRaises(IndexError):
+                first[4]
+            with self.assertRaises(IndexError):
+                first[-5]
+
+    def test_workers(self):
+        with SharedProgramImage.create(list(range(100))) as image:
+            with multiprocessing.Pool(2, attach_worker, (image.name, len(image))) as pool:
+                results = pool.map(_write_and_read, [[0, 50], [99, 1]])
+            self.assertEqual(results, [([-1, 50], 1), ([-1, 1], 1)])
+            # nothing the workers wrote ends up in the image
+            self.assertEqual(image.memory()[0], 0)
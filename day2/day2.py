@@ -1,6 +1,11 @@
 import abc
+import multiprocessing
 import operator
+import os
+import sys
 import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aoc import sharedimage
 
 class Instruction(abc.ABC):
     @abc.abstractmethod
@@ -36,9 +41,12 @@ class InstructionMultiply(BinaryInstruction):
         super(InstructionMultiply, self).__init__(operator.mul, 2)
 
 
+# The instructions don't keep state between calls, so every processor can share the same dispatch table
+OPERATIONS = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply()]}
+
 class IntcodeProcessor:
     def __init__(self):
-        self.operations = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply()]}
+        self.operations = OPERATIONS
 
     def Process(self, memory):
         instruction_pointer = 0
@@ -52,9 +60,11 @@ class IntcodeProcessor:
             tokens_consumed = self.operations[opcode].process(memory, instruction_pointer)
             instruction_pointer += tokens_consumed
 
+# the processor doesn't keep any state between runs, so we only need one
+PROCESSOR = IntcodeProcessor()
+
 def run(intcodes):
-    proc = IntcodeProcessor()
-    proc.Process(intcodes)
+    PROCESSOR.Process(intcodes)
     return intcodes
 
 class UnitTests(unittest.TestCase):
@@ -84,29 +94,62 @@ class UnitTests(unittest.TestCase):
         '''1,1,1,4,99,5,6,0,99 becomes 30,1,1,4,2,5,6,0,99.'''
         self.assertEqual(run([1,1,1,4,99,5,6,0,99]), [30,1,1,4,2,5,6,0,99])
 
+    def test_puzzle2_parallel(self):
+        self.assertEqual(puzzle2_parallel(2), 4019)
+
+def gravity_assist(program, noun, verb, memory = None):
+    '''Runs the program with noun and verb in addresses 1 and 2 and returns what ends up in address 0. Pass memory to
+    reuse that list instead of making a new copy of the program'''
+    if memory is None:
+        memory = [n for n in program]
+    else:
+        memory[:] = program
+    memory[1] = noun
+    memory[2] = verb
+    run(memory)
+    return memory[0]
+
+def find_noun_verb(program, target = 19690720):
+    '''Naive implementation, but it runs in a couple of seconds, so I can live with it...'''
+    # reuse the same list instead of making a new copy for every run
+    memory = [n for n in program]
+    for noun in range(100):
+        for verb in range(100):
+            if gravity_assist(program, noun, verb, memory) == target:
+                return 100 * noun + verb
+    return None
+
 def puzzle1():
     with open('input.txt') as f:
         memory = [int(n) for n in f.read().split(',')]
-        memory[1] = 12
-        memory[2] = 2
-        run(memory)
-        print(F"The result of puzzle 1 is {memory[0]}")
+        print(F"The result of puzzle 1 is {gravity_assist(memory, 12, 2)}")
 
 def puzzle2():
-    '''Naive implementation, but it runs in a couple of seconds, so I can live with it...'''
     with open('input.txt') as f:
         memory_at_reset = [int(n) for n in f.read().split(',')]
+        print(F"The result of puzzle 1 is {find_noun_verb(memory_at_reset)}")
 
-        possible_inputs = [(noun,verb) for noun in range(100) for verb in range(100)]
-        for noun,verb in possible_inputs:
-            memory = [n for n in memory_at_reset]
-            memory[1] = noun
-            memory[2] = verb
-            run(memory)
-            if memory[0] == 19690720:
-                print(F"The result of puzzle 1 is {100 * noun + verb}")
-                break
-
+def _find_verb_on_image(noun):
+    for verb in range(100):
+        memory = sharedimage.worker_image.memory()
+        memory[1] = noun
+        memory[2] = verb
+        run(memory)
+        if memory[0] == 19690720:
+            return 100 * noun + verb
+    return None
 
-puzzle1()
-puzzle2()
+def puzzle2_parallel(workers = None):
+    '''Every worker tries all verbs for one noun at a time. The program is put in shared memory once, and every run
+    only keeps the cells it writes to'''
+    with open('input.txt') as f:
+        program = [int(n) for n in f.read().split(',')]
+    with sharedimage.SharedProgramImage.create(program) as image:
+        with multiprocessing.Pool(workers, sharedimage.attach_worker, (image.name, len(image))) as pool:
+            for result in pool.imap_unordered(_find_verb_on_image, range(100)):
+                if result is not None:
+                    return result
+
+if __name__ == "__main__":
+    puzzle1()
+    puzzle2()
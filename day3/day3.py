@@ -1,3 +1,10 @@
+import os
+import sys
+import unittest
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aoc import inputs
+
 def is_vertical(line):
     return line[0][0] == line[1][0]
 
@@ -60,10 +67,20 @@ def path_to_lines(path):
 
     return [(coords[n], coords[n + 1]) for n in range(len(coords) - 1)]
 
+def wire_to_lines(directions, lengths):
+    '''Same as path_to_lines, but for a wire as loaded by inputs.load_wire_paths'''
+    dx = np.where(directions == ord('R'), lengths, 0) - np.where(directions == ord('L'), lengths, 0)
+    dy = np.where(directions == ord('U'), lengths, 0) - np.where(directions == ord('D'), lengths, 0)
+    assert (dx != 0).sum() + (dy != 0).sum() == np.count_nonzero(lengths), "Unknown direction"
+    x = np.concatenate(([0], np.cumsum(dx))).tolist()
+    y = np.concatenate(([0], np.cumsum(dy))).tolist()
+    coords = list(zip(x, y))
+    return [(coords[n], coords[n + 1]) for n in range(len(coords) - 1)]
+
 def get_min_cross_distance(path1, path2):
-    path1 = path_to_lines(path1)
-    path2 = path_to_lines(path2)
+    print(min_cross_distance(path_to_lines(path1), path_to_lines(path2)))
 
+def min_cross_distance(path1, path2):
     crosses = []
     for line1 in path1:
         for line2 in path2:
@@ -72,12 +89,12 @@ def get_min_cross_distance(path1, path2):
                 crosses.append(c)
 
     distances = [distance(c) for c in crosses]
-    print(min(distances))
+    return min(distances)
 
 def get_min_cross_distance2(path1, path2):
-    path1 = path_to_lines(path1)
-    path2 = path_to_lines(path2)
+    print(min_cross_steps(path_to_lines(path1), path_to_lines(path2)))
 
+def min_cross_steps(path1, path2):
     steps = []
     for i1, line1 in enumerate(path1):
         for i2, line2 in enumerate(path2):
@@ -87,13 +104,25 @@ def get_min_cross_distance2(path1, path2):
                 length2 = [line_length(l) for l in path2[:i2]] + [distance_from_start(line2, c)]
                 steps.append(sum(length1+length2))
 
-    print(min(steps))
-
-with open("input.txt") as f:
-    paths = [l.split(',') for l in f.readlines()]
-    get_min_cross_distance(paths[0], paths[1])
-    get_min_cross_distance2(paths[0], paths[1])
-
-# get_min_cross_distance2("R8,U5,L5,D3".split(','),"U7,R6,D4,L4".split(','))
-# get_min_cross_distance2("R75,D30,R83,U83,L12,D49,R71,U7,L72".split(','),"U62,R66,U55,R34,D71,R55,D58,R83".split(','))
-# get_min_cross_distance2("R98,U47,R26,D63,R33,U87,L62,D20,R33,U53,R51".split(','),"U98,R91,D20,R16,D67,R40,U7,R15,U6,R7".split(','))
\ No newline at end of file
+    return min(steps)
+
+class Day3UnitTests(unittest.TestCase):
+    def test_examples(self):
+        for path1, path2, min_distance, min_steps in [("R8,U5,L5,D3", "U7,R6,D4,L4", 6, 30),
+                                                      ("R75,D30,R83,U83,L12,D49,R71,U7,L72", "U62,R66,U55,R34,D71,R55,D58,R83", 159, 610),
+                                                      ("R98,U47,R26,D63,R33,U87,L62,D20,R33,U53,R51", "U98,R91,D20,R16,D67,R40,U7,R15,U6,R7", 135, 410)]:
+            lines1 = path_to_lines(path1.split(','))
+            lines2 = path_to_lines(path2.split(','))
+            self.assertEqual(min_cross_distance(lines1, lines2), min_distance)
+            self.assertEqual(min_cross_steps(lines1, lines2), min_steps)
+
+    def test_wire_to_lines(self):
+        with open("input.txt") as f:
+            paths = [l.strip().split(',') for l in f.readlines()]
+        wires = inputs.load_wire_paths("input.txt")
+        self.assertEqual([wire_to_lines(*wire) for wire in wires], [path_to_lines(path) for path in paths])
+
+if __name__ == "__main__":
+    wires = [wire_to_lines(*wire) for wire in inputs.load_wire_paths("input.txt")]
+    print(min_cross_distance(wires[0], wires[1]))
+    print(min_cross_steps(wires[0], wires[1]))
\ No newline at end of file
@@ -1,3 +1,6 @@
+import unittest
+import numpy as np
+
 def is_duplicate(digit, digits):
     return digits.count(digit) == 2
 
@@ -16,19 +19,69 @@ def isvalid(code, puzzle2 = False):
 
     return True
 
-'''There seem to be a lot of smart things we can do here and I'm sure we're going to need it for puzzle2
-but I'm just going to brute force this one'''
+def count_valid(start, end, puzzle2 = False):
+    '''Still tries every code in the range, but validate does all of them in a couple of array operations'''
+    return int(validate(np.arange(start, end+1), puzzle2).sum())
+
 def puzzle1(start,end):
-    valids = [n for n in range(start, end+1) if isvalid(n)]
-    print(len(valids))
+    print(count_valid(start, end))
 
 def puzzle2(start,end):
-    valids = [n for n in range(start, end+1) if isvalid(n, True)]
-    print(len(valids))
+    print(count_valid(start, end, True))
+
+def validate(codes, puzzle2 = False, chunk_size = 1 << 16):
+    '''isvalid for a whole array (or buffer of 64 bit integers) of codes at once. Returns a boolean mask.
+    We split the codes into digits with div and mod, one digit of all codes at a time, and compare every digit with
+    the one before it. That is done a chunk at a time, so everything we need for a chunk stays in the cache.'''
+    if isinstance(codes, (bytes, bytearray, memoryview)):
+        codes = np.frombuffer(codes, dtype=np.int64)
+    codes = np.asarray(codes, dtype=np.int64).ravel()
+    mask = np.empty(len(codes), dtype=bool)
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start : start + chunk_size]
+        valid = (chunk >= 100000) & (chunk <= 999999)
+        # six digits fit in 32 bits, which divides a lot faster
+        values = np.where(valid, chunk, 0).astype(np.int32)
+        digits = []
+        for _ in range(6):
+            digits.append(values % 10)
+            values //= 10
+        # digits[0] is the last digit, so the digits never decrease if every digit is at least the one after it
+        same = []
+        for n in range(5):
+            valid &= digits[n] >= digits[n + 1]
+            same.append(digits[n] == digits[n + 1])
+        if puzzle2:
+            # the digits never decrease, so a digit that appears exactly twice is a run of two equal digits
+            pairs = [same[n] & (n == 0 or ~same[n - 1]) & (n == 4 or ~same[n + 1]) for n in range(5)]
+        else:
+            pairs = same
+        mask[start : start + len(chunk)] = valid & np.logical_or.reduce(pairs)
+    return mask
+
+class Day4UnitTests(unittest.TestCase):
+    def test_examples(self):
+        self.assertEqual(validate([111111, 223450, 123789]).tolist(), [True, False, False])
+        self.assertEqual(validate([112233, 123444, 111122]).tolist(), [True, True, True])
+        self.assertEqual(validate([112233, 123444, 111122], True).tolist(), [True, False, True])
+
+    def test_same_as_isvalid(self):
+        codes = np.concatenate((np.arange(99990, 100100), np.random.default_rng(4).integers(100000, 1000000, 10000), [999999, 1000000, 0, 5]))
+        for puzzle2 in (False, True):
+            self.assertEqual(validate(codes, puzzle2, chunk_size=1000).tolist(), [isvalid(int(code), puzzle2) for code in codes])
+
+    def test_buffer(self):
+        codes = np.array([111111, 223450, 111122], dtype=np.int64)
+        self.assertEqual(validate(codes.tobytes(), True).tolist(), [False, False, True])
+
+    def test_puzzles(self):
+        self.assertEqual(count_valid(172851, 675869), 1660)
+        self.assertEqual(count_valid(172851, 675869, True), 1135)
 
-print(isvalid(111111)) # meets these criteria (double 11, never decreases).
-print(isvalid(223450))# does not meet these criteria (decreasing pair of digits 50).
-print(isvalid(123789)) # does not meet these criteria (no double).
+if __name__ == "__main__":
+    print(isvalid(111111)) # meets these criteria (double 11, never decreases).
+    print(isvalid(223450))# does not meet these criteria (decreasing pair of digits 50).
+    print(isvalid(123789)) # does not meet these criteria (no double).
 
-puzzle1(172851,675869)
-puzzle2(172851,675869)
\ No newline at end of file
+    puzzle1(172851,675869)
+    puzzle2(172851,675869)
@@ -1,5 +1,10 @@
 import abc
-import operator
+import argparse
+import io
+import os
+import struct
+import sys
+import threading
 import unittest
 
 class Instruction(abc.ABC):
@@ -11,7 +16,7 @@ class Instruction(abc.ABC):
         return self._opcode
 
     @abc.abstractmethod
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         pass
 
     def parameter_count(self):
@@ -66,7 +71,7 @@ class InstructionAdd(TernaryInstruction):
     def __init__(self):
         super(InstructionAdd, self).__init__(1)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         super(InstructionAdd, self).get_parameters(memory, startat, parameter_modes)
         super(InstructionAdd, self).store(self.parameter1 + self.parameter2, memory)
         return startat + self.parameter_count()
@@ -76,7 +81,7 @@ class InstructionMultiply(TernaryInstruction):
     def __init__(self):
         super(InstructionMultiply, self).__init__(2)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         super(InstructionMultiply, self).get_parameters(memory, startat, parameter_modes)
         super(InstructionMultiply, self).store(self.parameter1 * self.parameter2, memory)
         return startat + self.parameter_count()
@@ -85,9 +90,9 @@ class InstructionStore(UnaryInstruction):
     def __init__(self):
         super(InstructionStore, self).__init__(3)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         param = super(InstructionStore, self).get_parameter(memory[startat], parameter_modes[0], memory)
-        value = int(input("Input: "))
+        value = input_function()
         super(InstructionStore, self).set_parameter(memory[startat], parameter_modes[0], memory, value)
 
         return startat + self.parameter_count()
@@ -96,16 +101,16 @@ class InstructionLoad(UnaryInstruction):
     def __init__(self):
         super(InstructionLoad, self).__init__(4)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         param = super(InstructionLoad, self).get_parameter(memory[startat], parameter_modes[0], memory)
-        print(param)
+        output_function(param)
         return startat + self.parameter_count()
 
 class InstructionJumpIfTrue(BinaryInstruction):
     def __init__(self):
         super(InstructionJumpIfTrue, self).__init__(5)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         self.get_parameters(memory, startat, parameter_modes)
         if(self.parameter1 != 0):
             return self.parameter2
@@ -116,7 +121,7 @@ class InstructionJumpIfFalse(BinaryInstruction):
     def __init__(self):
         super(InstructionJumpIfFalse, self).__init__(6)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         self.get_parameters(memory, startat, parameter_modes)
         if(self.parameter1 == 0):
             return self.parameter2
@@ -127,7 +132,7 @@ class InstructionLessThen(TernaryInstruction):
     def __init__(self):
         super(InstructionLessThen, self).__init__(7)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         self.get_parameters(memory, startat, parameter_modes)
         super(InstructionLessThen, self).store(1 if self.parameter1 < self.parameter2 else 0, memory)
 
@@ -137,7 +142,7 @@ class InstructionEquals(TernaryInstruction):
     def __init__(self):
         super(InstructionEquals, self).__init__(8)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         self.get_parameters(memory, startat, parameter_modes)
         super(InstructionEquals, self).store(1 if self.parameter1 == self.parameter2 else 0, memory)
 
@@ -147,12 +152,89 @@ class InstructionHalt(NullaryInstruction):
     def __init__(self):
         super(InstructionHalt, self).__init__(99)
 
-    def process(self, memory, startat, parameter_modes):
+    def process(self, memory, startat, parameter_modes, input_function, output_function):
         return startat + self.parameter_count()
 
 
+class ConsoleIO:
+    '''Asks for every input on the console and prints every output'''
+    def read(self):
+        return int(input("Input: "))
+
+    def write(self, value):
+        print(value)
+
+    def flush(self):
+        pass
+
+class StreamIO:
+    '''Reads inputs from and writes outputs to file descriptors, pipes or files, a whole buffer at a time instead of one
+    system call per value. Text framing is whitespace separated decimal numbers (one output per line), binary framing
+    is one little endian signed 64 bit integer per value.'''
+    BINARY_VALUE = struct.Struct('<q')
+
+    def __init__(self, input = None, output = None, binary = False, buffer_size = 1 << 16):
+        self._input = self._open(input, 'rb')
+        self._output = self._open(output, 'wb')
+        self._binary = binary
+        self._buffer_size = buffer_size
+        self._values = []
+        self._next = 0
+        self._rest = b''
+        self._written = []
+
+    @staticmethod
+    def _open(target, mode):
+        '''target can be a file descriptor, a path or a binary file object'''
+        if target is None or hasattr(target, 'read' if 'r' in mode else 'write'):
+            return target
+        if isinstance(target, int):
+            # unbuffered reads return whatever the pipe has, but an unbuffered write can write less than we asked, so
+            # the output gets a buffered writer, which writes everything or raises
+            return os.fdopen(target, mode, buffering=0 if 'r' in mode else -1, closefd=False)
+        return open(target, mode)
+
+    def _fill(self):
+        while self._next >= len(self._values):
+            assert self._input is not None, "Instruction needs input, but there is no input stream"
+            block = self._input.read(self._buffer_size)
+            data = self._rest + block
+            assert block or (data.strip() and not self._binary), "Instruction needs input, but the input stream has ended"
+            if self._binary:
+                end = len(data) - len(data) % self.BINARY_VALUE.size
+                self._values = [value for value, in self.BINARY_VALUE.iter_unpack(data[:end])]
+            else:
+                # a number can be split over two blocks, keep the last one until we know it's complete
+                end = len(data) if not block else max(data.rfind(b' '), data.rfind(b'\n'), data.rfind(b'\t'), data.rfind(b','), -1) + 1
+                self._values = [int(token) for token in data[:end].replace(b',', b' ').split()]
+            self._rest = data[end:]
+            self._next = 0
+
+    def read(self):
+        self._fill()
+        value = self._values[self._next]
+        self._next += 1
+        return value
+
+    def write(self, value):
+        self._written.append(value)
+        if len(self._written) * 8 >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._written:
+            return
+        if self._binary:
+            data = b''.join(self.BINARY_VALUE.pack(value) for value in self._written)
+        else:
+            data = ''.join(F"{value}\n" for value in self._written).encode('ascii')
+        self._output.write(data)
+        self._output.flush()
+        self._written = []
+
 class IntcodeProcessor:
-    def __init__(self):
+    def __init__(self, io = None):
+        self.io = io if io is not None else ConsoleIO()
         self.operations = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply(), InstructionHalt(), InstructionStore(), InstructionLoad(), InstructionJumpIfFalse(), InstructionJumpIfTrue(), InstructionLessThen(), InstructionEquals() ]}
 
     def Process(self, memory):
@@ -165,8 +247,9 @@ class IntcodeProcessor:
 
             instruction_pointer += 1
             assert opcode in self.operations, F"Unknown opcode {opcode}"
-            next = self.operations[opcode].process(memory, instruction_pointer, parameter_modes)
+            next = self.operations[opcode].process(memory, instruction_pointer, parameter_modes, self.io.read, self.io.write)
             instruction_pointer = next
+        self.io.flush()
 
     def split_instruction(self, instruction):
         opcode = instruction % 100
@@ -177,8 +260,8 @@ class IntcodeProcessor:
         parameter_modes += ([0] *(parameter_count - len(parameter_modes)))
         return (opcode, parameter_modes)
 
-def run(intcodes):
-    proc = IntcodeProcessor()
+def run(intcodes, io = None):
+    proc = IntcodeProcessor(io)
     proc.Process(intcodes)
     return intcodes
 
@@ -212,9 +295,62 @@ class IntcodeProcessorTests(unittest.TestCase):
         self.assertEqual(run([2, 4, 4, 5, 99, 0]), [2, 4, 4, 5, 99, 9801])
         self.assertEqual(run([1, 1, 1, 4, 99, 5, 6, 0, 99]), [30, 1, 1, 4, 2, 5, 6, 0, 99])
 
+    def test_stream_io(self):
+        with open('input.txt') as f:
+            program = [int(n) for n in f.read().split(',')]
+        output = io.BytesIO()
+        run([n for n in program], StreamIO(io.BytesIO(b"1\n"), output))
+        values = [int(n) for n in output.getvalue().split()]
+        self.assertTrue(all(v == 0 for v in values[:-1]))
+        self.assertEqual(values[-1], 9219874)
+
+        output = io.BytesIO()
+        run([n for n in program], StreamIO(io.BytesIO(StreamIO.BINARY_VALUE.pack(5)), output, binary=True))
+        self.assertEqual(output.getvalue(), StreamIO.BINARY_VALUE.pack(5893654))
+
+    def test_stream_io_buffering(self):
+        # a tiny buffer splits numbers over reads and flushes while running
+        output = io.BytesIO()
+        stream = StreamIO(io.BytesIO(b"12 345\n-6789,10"), output, buffer_size=3)
+        self.assertEqual([stream.read() for _ in range(4)], [12, 345, -6789, 10])
+        for value in range(5):
+            stream.write(value)
+        stream.flush()
+        self.assertEqual(output.getvalue(), b"0\n1\n2\n3\n4\n")
+
+    def test_stream_io_pipe(self):
+        # more output than fits in a pipe, with someone reading at the other end
+        read_end, write_end = os.pipe()
+        chunks = []
+        reader = threading.Thread(target=lambda: chunks.extend(iter(lambda: os.read(read_end, 1 << 16), b'')))
+        reader.start()
+        stream = StreamIO(output=write_end)
+        self.assertIsInstance(stream._output, io.BufferedWriter)
+        for value in range(10**5):
+            stream.write(value)
+        stream.flush()
+        os.close(write_end)
+        reader.join()
+        os.close(read_end)
+        self.assertEqual([int(n) for n in b''.join(chunks).split()], list(range(10**5)))
+
 def puzzle1():
     with open('input.txt') as f:
         memory = [int(n) for n in f.read().split(',')]
         run(memory)
 
-puzzle1()
\ No newline at end of file
+def run_filter(program_file, binary):
+    '''Runs the program as a unix filter: inputs come from stdin and outputs go to stdout'''
+    with open(program_file) as f:
+        memory = [int(n) for n in f.read().split(',')]
+    run(memory, StreamIO(sys.stdin.fileno(), sys.stdout.fileno(), binary))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('program', nargs='?', help="Run this program as a filter from stdin to stdout instead of puzzle 1")
+    parser.add_argument('--binary', action='store_true', help="Values are 64 bit little endian integers instead of text")
+    args = parser.parse_args()
+    if args.program:
+        run_filter(args.program, args.binary)
+    else:
+        puzzle1()
\ No newline at end of file
@@ -1,5 +1,11 @@
+import os
+import sys
 import unittest
+from array import array
 from collections import defaultdict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aoc import inputs
+
 def get_orbitees(lines):
     orbits = {}
     for l in lines:
@@ -23,8 +29,7 @@ def get_number_of_orbits(orbits, orbiter):
         return 1 + get_number_of_orbits(orbits, orbits[orbiter])
 
 def puzzle1(input):
-    orbits = get_orbitees(input)
-    return sum([get_number_of_orbits(orbits, o) for o in orbits.keys()])
+    return CompactOrbitGraph(input).total_orbits()
 
 def find_santa(orbits, start_from, hops_so_far = 0, prev=None):
     '''I don't think there can be more than one path to santa and one planet can't directly orbit more than one other planet, but since they explicitly ask for the shortest path I set this
@@ -41,11 +46,195 @@ def find_santa(orbits, start_from, hops_so_far = 0, prev=None):
     return r
 
 def puzzle2(input):
-    orbiters = get_orbiters(input)
-    paths = find_santa(orbiters, "YOU")
-    # subtracty one to ignore the hop from YOU to the nearest planet
-    return min(paths) - 1
+    return transfers_to_santa(CompactOrbitGraph(input))
+
+def transfers_to_santa(graph):
+    # subtract two, we're counting the hops between the objects YOU and SAN are orbiting
+    return AncestorIndex(graph).distance("YOU", "SAN") - 2
+
+class CompactOrbitGraph:
+    '''The orbit map with every body interned to a dense integer id. Parents and children are stored in typed arrays
+    (children in CSR form: the children of body n are children[child_offsets[n]:child_offsets[n + 1]]), so we don't
+    need a dict entry per body per direction like get_orbitees and get_orbiters do.'''
+    def __init__(self, lines):
+        self.ids = {}
+        self.names = []
+        edges = array('l')
+        for l in lines:
+            orbitee, orbiter = l.strip().split(')')
+            edges.append(self.intern(orbitee))
+            edges.append(self.intern(orbiter))
+        self._build(edges)
+
+    @classmethod
+    def from_file(cls, path):
+        '''Builds the graph from the (cached) bulk parse of an input file'''
+        names, edges = inputs.load_orbit_edges(path)
+        graph = cls([])
+        graph.names = names
+        graph.ids = {name: id for id, name in enumerate(names)}
+        graph._build(array('l', edges.ravel().tolist()))
+        return graph
+
+    def _build(self, edges):
+        '''edges holds orbitee, orbiter pairs of ids'''
+        count = len(self.names)
+        self.parent = array('l', [-1]) * count
+        child_offsets = array('l', [0]) * (count + 1)
+        for n in range(0, len(edges), 2):
+            orbitee, orbiter = edges[n], edges[n + 1]
+            assert self.parent[orbiter] == -1, F"Something went wrong. It seems {self.names[orbiter]} orbits both {self.names[self.parent[orbiter]]} and {self.names[orbitee]}"
+            self.parent[orbiter] = orbitee
+            child_offsets[orbitee + 1] += 1
+        for n in range(count):
+            child_offsets[n + 1] += child_offsets[n]
+
+        fill = child_offsets[:-1]
+        self.children = array('l', [0]) * (len(edges) // 2)
+        for orbiter, orbitee in enumerate(self.parent):
+            if orbitee != -1:
+                self.children[fill[orbitee]] = orbiter
+                fill[orbitee] += 1
+        self.child_offsets = child_offsets
+        self.depth = self._get_depths()
+
+    def intern(self, name):
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def get_children(self, body):
+        return self.children[self.child_offsets[body] : self.child_offsets[body + 1]]
+
+    def breadth_first(self):
+        '''All bodies, every parent before its children'''
+        order = array('l', (body for body, parent in enumerate(self.parent) if parent == -1))
+        n = 0
+        while n < len(order):
+            body = order[n]
+            order.extend(self.children[self.child_offsets[body] : self.child_offsets[body + 1]])
+            n += 1
+        assert len(order) == len(self.names), "Not all bodies can be reached from a center of mass. Is there an orbit loop?"
+        return order
+
+    def _get_depths(self):
+        depth = array('l', [0]) * len(self.names)
+        for body in self.breadth_first():
+            if self.parent[body] != -1:
+                depth[body] = depth[self.parent[body]] + 1
+        return depth
+
+    def total_orbits(self):
+        return sum(self.depth)
+
+class AncestorIndex:
+    '''Lowest common ancestor index (binary lifting) over a CompactOrbitGraph.
+    Building it is O(n log n), after which every distance query is O(log n), so we don't have to search
+    the whole map again for every pair of bodies we want to know the distance between.'''
+    def __init__(self, graph):
+        self.graph = graph
+        levels = max(1, max(graph.depth, default=0).bit_length())
+        # up[k][body] is the body 2^k hops closer to the center of mass, or -1 if there is no such body
+        self.up = [graph.parent]
+        for k in range(1, levels):
+            previous = self.up[k - 1]
+            self.up.append(array('l', (-1 if ancestor == -1 else previous[ancestor] for ancestor in previous)))
+
+    def ancestor(self, body, hops):
+        k = 0
+        while hops:
+            if hops & 1:
+                body = self.up[k][body]
+            hops >>= 1
+            k += 1
+        return body
+
+    def _lowest_common_ancestor(self, a, b):
+        depth = self.graph.depth
+        if depth[a] < depth[b]:
+            a, b = b, a
+        a = self.ancestor(a, depth[a] - depth[b])
+        if a == b:
+            return a
+        for k in reversed(range(len(self.up))):
+            up = self.up[k]
+            if up[a] != up[b]:
+                a, b = up[a], up[b]
+        assert self.up[0][a] == self.up[0][b] != -1, F"{self.graph.names[a]} and {self.graph.names[b]} don't orbit the same center of mass"
+        return self.up[0][a]
 
+    def lowest_common_ancestor(self, a, b):
+        return self.graph.names[self._lowest_common_ancestor(self.graph.ids[a], self.graph.ids[b])]
+
+    def distance(self, a, b):
+        a, b = self.graph.ids[a], self.graph.ids[b]
+        depth = self.graph.depth
+        return depth[a] + depth[b] - 2 * depth[self._lowest_common_ancestor(a, b)]
+
+class OrbitMap:
+    '''Orbit map that can be built up one "A)B" edge at a time, in any order.
+    Every body keeps its depth relative to the root of the (partial) tree it is in. We store those as offsets in a
+    union-find structure, so when a tree gets attached to a new parent, we only have to adjust the offset of its
+    representative instead of walking the whole subtree.'''
+    def __init__(self, lines = []):
+        self.orbitees = {}
+        self.total_orbits = 0
+        self._link = {}
+        self._offset = {}
+        self._size = {}
+        for l in lines:
+            self.add_line(l)
+
+    def _add_body(self, body):
+        if body not in self._link:
+            self._link[body] = body
+            self._offset[body] = 0
+            self._size[body] = 1
+
+    def _find(self, body):
+        '''Returns the representative of body and its depth relative to the representative'''
+        path = []
+        while self._link[body] != body:
+            path.append(body)
+            body = self._link[body]
+        root = body
+        # compress the path, so every body points straight at the representative
+        offset = 0
+        for b in reversed(path):
+            offset += self._offset[b]
+            self._offset[b] = offset
+            self._link[b] = root
+        return root, (self._offset[path[0]] if path else 0)
+
+    def add_line(self, line):
+        orbitee, orbiter = line.strip().split(')')
+        self.add(orbitee, orbiter)
+
+    def add(self, orbitee, orbiter):
+        assert orbiter not in self.orbitees, F"Something went wrong. It seems {orbiter} orbits both {self.orbitees[orbiter]} and {orbitee}"
+        self._add_body(orbitee)
+        self._add_body(orbiter)
+        orbitee_root, _ = self._find(orbitee)
+        orbiter_root, _ = self._find(orbiter)
+        assert orbitee_root != orbiter_root, F"{orbitee}){orbiter} would create an orbit loop"
+        self.orbitees[orbiter] = orbitee
+
+        # orbiter was the root of its tree, so everything in that tree moves down by the depth of its new parent + 1
+        shift = self.depth(orbitee) + 1
+        self.total_orbits += shift * self._size[orbiter_root]
+        # the absolute depth of a representative is its offset
+        self._offset[orbiter_root] += shift
+        if self._size[orbitee_root] < self._size[orbiter_root]:
+            orbitee_root, orbiter_root = orbiter_root, orbitee_root
+        self._link[orbiter_root] = orbitee_root
+        self._offset[orbiter_root] -= self._offset[orbitee_root]
+        self._size[orbitee_root] += self._size[orbiter_root]
+
+    def depth(self, body):
+        root, depth = self._find(body)
+        return depth + self._offset[root]
 
 class Day6UnitTests(unittest.TestCase):
     def test_puzzle1(self):
@@ -54,6 +243,58 @@ class Day6UnitTests(unittest.TestCase):
     def test_puzzle2(self):
         self.assertEqual(puzzle2(["COM)B","B)C","C)D","D)E","E)F","B)G","G)H","D)I","E)J","J)K","K)L","K)YOU","I)SAN"]), 4)
 
+    def test_ancestor_index(self):
+        index = AncestorIndex(CompactOrbitGraph(["COM)B","B)C","C)D","D)E","E)F","B)G","G)H","D)I","E)J","J)K","K)L","K)YOU","I)SAN"]))
+        self.assertEqual(index.lowest_common_ancestor("YOU", "SAN"), "D")
+        self.assertEqual(index.lowest_common_ancestor("H", "L"), "B")
+        self.assertEqual(index.lowest_common_ancestor("L", "E"), "E")
+        self.assertEqual(index.distance("K", "I"), 4)
+        self.assertEqual(index.distance("COM", "L"), 7)
+        self.assertEqual(index.distance("F", "F"), 0)
+
+    def test_orbit_map(self):
+        lines = ["COM)B","B)C","C)D","D)E","E)F","B)G","G)H","D)I","E)J","J)K","K)L"]
+        for order in [lines, list(reversed(lines)), lines[5:] + lines[:5], lines[1::2] + lines[::2]]:
+            orbits = OrbitMap(order)
+            self.assertEqual(orbits.total_orbits, 42)
+            self.assertEqual(orbits.depth("COM"), 0)
+            self.assertEqual(orbits.depth("D"), 3)
+            self.assertEqual(orbits.depth("L"), 7)
+
+    def test_orbit_map_partial(self):
+        orbits = OrbitMap()
+        orbits.add("J", "K")
+        orbits.add("K", "L")
+        self.assertEqual(orbits.total_orbits, 3)
+        orbits.add("E", "J")
+        self.assertEqual(orbits.total_orbits, 6)
+        self.assertEqual(orbits.depth("L"), 3)
+        with self.assertRaises(AssertionError):
+            orbits.add("L", "E")
+
+    def test_compact_orbit_graph(self):
+        graph = CompactOrbitGraph(["COM)B","B)C","C)D","D)E","E)F","B)G","G)H","D)I","E)J","J)K","K)L"])
+        self.assertEqual(graph.names[0], "COM")
+        self.assertEqual(graph.parent[graph.ids["COM"]], -1)
+        self.assertEqual(graph.names[graph.parent[graph.ids["G"]]], "B")
+        self.assertEqual(sorted(graph.names[c] for c in graph.get_children(graph.ids["B"])), ["C", "G"])
+        self.assertEqual(graph.depth[graph.ids["L"]], 7)
+
+    def test_input(self):
+        lines = open('input.txt').readlines()
+        self.assertEqual(puzzle1(lines), 294191)
+        self.assertEqual(puzzle2(lines), 424)
+        self.assertEqual(OrbitMap(reversed(lines)).total_orbits, 294191)
+        orbits = get_orbitees(lines)
+        self.assertEqual(sum([get_number_of_orbits(orbits, o) for o in orbits.keys()]), 294191)
+        self.assertEqual(min(find_santa(get_orbiters(lines), "YOU")) - 1, 424)
+
+    def test_from_file(self):
+        graph = CompactOrbitGraph.from_file('input.txt')
+        self.assertEqual(graph.total_orbits(), 294191)
+        self.assertEqual(transfers_to_santa(graph), 424)
+
 if __name__ == "__main__":
-    print(F"The asnwer for puzzle 1 is {puzzle1(open('input.txt').readlines())}")
-    print(F"The answer for puzzle 2 is {puzzle2(open('input.txt').readlines())}")
\ No newline at end of file
+    graph = CompactOrbitGraph.from_file('input.txt')
+    print(F"The asnwer for puzzle 1 is {graph.total_orbits()}")
+    print(F"The answer for puzzle 2 is {transfers_to_santa(graph)}")
\ No newline at end of file
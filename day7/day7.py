@@ -1,5 +1,15 @@
 import abc
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import sys
+import threading
+import time
 import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aoc import sharedimage
 
 class Instruction(abc.ABC):
     def __init__(self, opcode, parameter_count):
@@ -43,21 +53,22 @@ class BinaryInstruction(Instruction):
         super(BinaryInstruction, self).__init__(opcode, 2)
 
     def get_parameters(self, memory, startat, parameter_modes):
-        self.parameter1 = super(BinaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory)
-        self.parameter2 = super(BinaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory)
+        parameter1 = super(BinaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory)
+        parameter2 = super(BinaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory)
+        return parameter1, parameter2
 
 class TernaryInstruction(Instruction):
     def __init__(self, opcode):
         super(TernaryInstruction, self).__init__(opcode, 3)
 
-    def store(self, value, memory):
-        assert len(memory) > self.parameter3, F"Can't access location {self.parameter3} in memory with size {len(memory)}"
-        memory[self.parameter3] = value
+    def store(self, address, value, memory):
+        assert len(memory) > address, F"Can't access location {address} in memory with size {len(memory)}"
+        memory[address] = value
 
     def get_parameters(self, memory, startat, parameter_modes):
-        self.parameter1 = super(TernaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory)
-        self.parameter2 = super(TernaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory)
-        self.parameter3 = memory[startat + 2]
+        parameter1 = super(TernaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory)
+        parameter2 = super(TernaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory)
+        return parameter1, parameter2, memory[startat + 2]
 
 
 
@@ -66,8 +77,8 @@ class InstructionAdd(TernaryInstruction):
         super(InstructionAdd, self).__init__(1)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        super(InstructionAdd, self).get_parameters(memory, startat, parameter_modes)
-        super(InstructionAdd, self).store(self.parameter1 + self.parameter2, memory)
+        parameter1, parameter2, parameter3 = super(InstructionAdd, self).get_parameters(memory, startat, parameter_modes)
+        super(InstructionAdd, self).store(parameter3, parameter1 + parameter2, memory)
         return startat + self.parameter_count()
 
 
@@ -76,8 +87,8 @@ class InstructionMultiply(TernaryInstruction):
         super(InstructionMultiply, self).__init__(2)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        super(InstructionMultiply, self).get_parameters(memory, startat, parameter_modes)
-        super(InstructionMultiply, self).store(self.parameter1 * self.parameter2, memory)
+        parameter1, parameter2, parameter3 = super(InstructionMultiply, self).get_parameters(memory, startat, parameter_modes)
+        super(InstructionMultiply, self).store(parameter3, parameter1 * parameter2, memory)
         return startat + self.parameter_count()
 
 class InstructionStore(UnaryInstruction):
@@ -105,9 +116,9 @@ class InstructionJumpIfTrue(BinaryInstruction):
         super(InstructionJumpIfTrue, self).__init__(5)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        self.get_parameters(memory, startat, parameter_modes)
-        if(self.parameter1 != 0):
-            return self.parameter2
+        parameter1, parameter2 = self.get_parameters(memory, startat, parameter_modes)
+        if(parameter1 != 0):
+            return parameter2
         else:
             return startat + self.parameter_count()
 
@@ -116,9 +127,9 @@ class InstructionJumpIfFalse(BinaryInstruction):
         super(InstructionJumpIfFalse, self).__init__(6)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        self.get_parameters(memory, startat, parameter_modes)
-        if(self.parameter1 == 0):
-            return self.parameter2
+        parameter1, parameter2 = self.get_parameters(memory, startat, parameter_modes)
+        if(parameter1 == 0):
+            return parameter2
         else:
             return startat + self.parameter_count()
 
@@ -127,8 +138,8 @@ class InstructionLessThen(TernaryInstruction):
         super(InstructionLessThen, self).__init__(7)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        self.get_parameters(memory, startat, parameter_modes)
-        super(InstructionLessThen, self).store(1 if self.parameter1 < self.parameter2 else 0, memory)
+        parameter1, parameter2, parameter3 = self.get_parameters(memory, startat, parameter_modes)
+        super(InstructionLessThen, self).store(parameter3, 1 if parameter1 < parameter2 else 0, memory)
 
         return startat + self.parameter_count()
 
@@ -137,8 +148,8 @@ class InstructionEquals(TernaryInstruction):
         super(InstructionEquals, self).__init__(8)
 
     def process(self, memory, startat, parameter_modes, input_function, output_function):
-        self.get_parameters(memory, startat, parameter_modes)
-        super(InstructionEquals, self).store(1 if self.parameter1 == self.parameter2 else 0, memory)
+        parameter1, parameter2, parameter3 = self.get_parameters(memory, startat, parameter_modes)
+        super(InstructionEquals, self).store(parameter3, 1 if parameter1 == parameter2 else 0, memory)
 
         return startat + self.parameter_count()
 
@@ -150,13 +161,31 @@ class InstructionHalt(NullaryInstruction):
         return startat + self.parameter_count()
 
 
+# The instructions don't keep state between calls, so every processor can share the same dispatch table
+OPERATIONS = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply(), InstructionHalt(), InstructionStore(), InstructionLoad(), InstructionJumpIfFalse(), InstructionJumpIfTrue(), InstructionLessThen(), InstructionEquals() ]}
+
 class IntcodeProcessor:
     def __init__(self, program, input = []):
-        self.operations = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply(), InstructionHalt(), InstructionStore(), InstructionLoad(), InstructionJumpIfFalse(), InstructionJumpIfTrue(), InstructionLessThen(), InstructionEquals() ]}
+        self.operations = OPERATIONS
         self.output = []
         self.input = input
         self.memory = program
         self.instruction_pointer = 0
+        # counters for telemetry, cheap enough to always keep
+        self.steps = 0
+        self.consumed = 0
+        self.produced = 0
+
+    def reset(self, program, input = []):
+        '''Get ready to run program from the start. Unlike the constructor this copies the program into the memory
+        we already have, so the caller doesn't have to make a copy and we don't allocate a new list'''
+        self.memory[:] = program
+        self.input = list(input)
+        self.output = []
+        self.instruction_pointer = 0
+        self.steps = 0
+        self.consumed = 0
+        self.produced = 0
 
     def Process(self):
         while True:
@@ -171,6 +200,7 @@ class IntcodeProcessor:
             assert opcode in self.operations, F"Unknown opcode {opcode}"
             next = self.operations[opcode].process(self.memory, self.instruction_pointer, parameter_modes, self.get_input, self.write_output)
             self.instruction_pointer = next
+            self.steps += 1
 
             if opcode == 4:
                 return 'OUTPUT'
@@ -179,10 +209,12 @@ class IntcodeProcessor:
         assert len(self.input) > 0, "Instruction needs input, but input is empty!"
         v = self.input[0]
         self.input = self.input[1:]
+        self.consumed += 1
         return v
 
     def write_output(self, value):
         self.output.append(value)
+        self.produced += 1
 
     def split_instruction(self, instruction):
         opcode = instruction % 100
@@ -193,10 +225,16 @@ class IntcodeProcessor:
         parameter_modes += ([0] *(parameter_count - len(parameter_modes)))
         return (opcode, parameter_modes)
 
+def run_to_halt(processor):
+    '''Runs until the program halts, however many outputs it produces on the way. Waiting for input that isn't
+    there would take forever, so that fails instead'''
+    status = processor.Process()
+    while status == 'OUTPUT':
+        status = processor.Process()
+    assert status == 'HALT', F"The program stopped with {status} instead of halting"
+
 def run(intcodes):
-    proc = IntcodeProcessor(intcodes)
-    while proc.Process() != 'HALT':
-        pass
+    run_to_halt(IntcodeProcessor(intcodes))
     return intcodes
 
 class IntcodeProcessorTests(unittest.TestCase):
@@ -212,6 +250,12 @@ class IntcodeProcessorTests(unittest.TestCase):
         # mul
         self.assertEqual(run([1102, 5, 6, 3, 99, 25, 35]), [1102, 5, 6, 30, 99, 25, 35])
 
+    def test_shared_operations(self):
+        # processors on other threads share the same instructions, so they must not keep anything between calls
+        run([1101, 5, 6, 3, 1107, 1, 2, 9, 99, 0])
+        for operation in OPERATIONS.values():
+            self.assertEqual(set(vars(operation)), {'_opcode', '_parameter_count'})
+
     def test_split_oppcode(self):
         proc = IntcodeProcessor([])
         self.assertEqual(proc.split_instruction(1), (1,[0,0,0]))
@@ -233,8 +277,7 @@ class IntcodeProcessorTests(unittest.TestCase):
         with open('../day5/input.txt') as f:
             memory = [int(n) for n in f.read().split(',')]
             proc = IntcodeProcessor(memory, [1])
-            while proc.Process() != 'HALT':
-                pass
+            run_to_halt(proc)
             self.assertTrue(all(v == 0 for v in proc.output[:-1]))
             self.assertEqual(proc.output[-1], 9219874)
 
@@ -242,8 +285,7 @@ class IntcodeProcessorTests(unittest.TestCase):
         with open('../day5/input.txt') as f:
             memory = [int(n) for n in f.read().split(',')]
             proc = IntcodeProcessor(memory, [5])
-            while proc.Process() != 'HALT':
-                pass
+            run_to_halt(proc)
             self.assertEqual(proc.output, [5893654])
 
     def test_day7_puzzle1(self):
@@ -274,6 +316,162 @@ class IntcodeProcessorTests(unittest.TestCase):
                      run_amplifier_series_loop(
                          [3,52,1001,52,-5,52,3,53,1,52,56,54,1007,54,5,55,1005,55,26,1001,54,-5,54,1105,1,12,1,53,54,53,1008,54,0,55,1001,55,1,55,2,53,55,53,4,53,1001,56,-1,56,1005,56,6,99,0,0,0,0,10], [9,7,8,5,6]))
 
+    def test_telemetry(self):
+        telemetry = Telemetry()
+        program = [3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5]
+        self.assertEqual(139629729, run_amplifier_series_loop(program, [9,8,7,6,5], telemetry))
+        snapshot = telemetry.snapshot()
+        # the amplifiers went back to the pool, running something else on them doesn't change the counters
+        self.assertEqual(18216, run_amplifier_series_loop([3,52,1001,52,-5,52,3,53,1,52,56,54,1007,54,5,55,1005,55,26,1001,54,-5,54,1105,1,12,1,53,54,53,1008,54,0,55,1001,55,1,55,2,53,55,53,4,53,1001,56,-1,56,1005,56,6,99,0,0,0,0,10], [9,7,8,5,6]))
+        self.assertEqual(telemetry.snapshot(), snapshot)
+        self.assertEqual(len(snapshot), 5)
+        # every amplifier reads its phase and 5 signals and writes 5 signals
+        self.assertEqual([machine['consumed'] for machine in snapshot], [6] * 5)
+        self.assertEqual([machine['produced'] for machine in snapshot], [5] * 5)
+        self.assertTrue(all(machine['instructions'] > 0 for machine in snapshot))
+        self.assertTrue(all(machine['blocked_seconds'] > 0 for machine in snapshot))
+        text = telemetry.prometheus(snapshot)
+        self.assertIn('intcode_values_produced_total{machine="4"} 5', text)
+        self.assertIn('# TYPE intcode_queue_depth gauge', text)
+
+    def test_parallel(self):
+        with open('input.txt') as f:
+            program = [int(n) for n in f.read().split(',')]
+        self.assertEqual(max_thruster_signal_parallel(program, list(range(5)), workers=2), 272368)
+        self.assertEqual(max_thruster_signal_parallel(program, [5,6,7,8,9], True, workers=2), 19741286)
+
+    def test_amplifier_network(self):
+        program = [3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5]
+        for shards in (1, 2, 5):
+            self.assertEqual(run_amplifier_network(program, [9,8,7,6,5], shards, batch_size=2), 139629729)
+        with open('input.txt') as f:
+            program = [int(n) for n in f.read().split(',')]
+        self.assertEqual(run_amplifier_network(program, [9,7,8,5,6], 3), run_amplifier_series_loop(program, [9,7,8,5,6]))
+
+    def test_bigger_network(self):
+        # adds its phase to every value that passes through it, 100 times
+        program = [3,18,3,19,1,18,19,19,4,19,1001,20,-1,20,1005,20,2,99,0,0,100]
+        self.assertEqual(run_amplifier_network(program, list(range(20)), 4, batch_size=8), 100 * sum(range(20)))
+
+    def test_amplifier_network_burst(self):
+        # reads its phase and outputs it 50000 times, which is a lot more than fits in a pipe
+        program = [3, 20, 4, 20, 1001, 21, -1, 21, 1005, 21, 2, 99] + [0] * 8 + [0, 50000]
+        start = time.perf_counter()
+        self.assertEqual(run_amplifier_network(program, [1, 2], 2, batch_size=64), 2)
+        self.assertEqual(run_amplifier_network(program, [1, 2, 3, 4], 4, batch_size=1000), 4)
+        self.assertLess(time.perf_counter() - start, 30)
+
+    def test_amplifier_network_deadlock(self):
+        # reads three values and never outputs anything
+        with self.assertRaises(DeadlockError):
+            run_amplifier_network([3,0,3,0,3,0,99], [1,2,3,4], 2)
+
+    def test_run_without_input(self):
+        with self.assertRaises(AssertionError):
+            run([4, 0, 3, 0, 99])
+
+    def test_processor_pool(self):
+        pool = ProcessorPool()
+        program = [3, 9, 1, 9, 9, 9, 4, 9, 99, 0]
+        processor = pool.acquire(program, [21])
+        run_to_halt(processor)
+        self.assertEqual(processor.output, [42])
+        # the program itself is never modified
+        self.assertEqual(program[9], 0)
+        pool.release([processor])
+
+        self.assertIs(pool.acquire(program, [2]), processor)
+        run_to_halt(processor)
+        self.assertEqual(processor.output, [4])
+        self.assertIsNot(pool.acquire(program, [2]), processor)
+
+
+class ProcessorPool:
+    '''Processors that are done can be handed back to the pool, so the next run can reset them instead of building new ones'''
+    def __init__(self):
+        self._free = []
+
+    def acquire(self, program, input = []):
+        if isinstance(program, sharedimage.SharedProgramImage):
+            # nothing to reset, a fresh copy on write view of the image costs nothing
+            return IntcodeProcessor(program.memory(), list(input))
+        processor = self._free.pop() if self._free else IntcodeProcessor([])
+        processor.reset(program, input)
+        return processor
+
+    def release(self, processors):
+        self._free.extend(processor for processor in processors if isinstance(processor.memory, list))
+
+POOL = ProcessorPool()
+
+class Telemetry:
+    '''Per machine counters for a network of processors: instructions executed, time spent waiting for input, values
+    produced and consumed and the number of values waiting in the input queue. The counters are read from the
+    processors when we take a snapshot, so watching a network costs next to nothing while it runs. When the run is
+    over finish keeps the last counters and lets go of the processors, which go back to the pool for other runs.
+    Snapshots are written every interval seconds, as a Prometheus text file or appended as json lines.'''
+    def __init__(self, path = None, format = 'prometheus', interval = 1.0):
+        assert format in ('prometheus', 'jsonl'), F"Unknown telemetry format {format}"
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.machines = []
+        self.blocked_seconds = []
+        self._blocked_since = []
+        self._final = None
+        self._last_export = time.perf_counter()
+
+    def watch(self, processors):
+        self.machines = processors
+        self.blocked_seconds = [0.0] * len(processors)
+        self._blocked_since = [None] * len(processors)
+        self._final = None
+
+    def finish(self):
+        self._final = self.snapshot()
+        self.machines = []
+
+    def blocked(self, machine):
+        self._blocked_since[machine] = time.perf_counter()
+
+    def resumed(self, machine):
+        now = time.perf_counter()
+        if self._blocked_since[machine] is not None:
+            self.blocked_seconds[machine] += now - self._blocked_since[machine]
+            self._blocked_since[machine] = None
+        if self.path is not None and now - self._last_export >= self.interval:
+            self.export()
+
+    def snapshot(self):
+        if self._final is not None:
+            return [dict(machine) for machine in self._final]
+        return [{'machine': n, 'instructions': processor.steps, 'blocked_seconds': self.blocked_seconds[n],
+                 'produced': processor.produced, 'consumed': processor.consumed, 'queue_depth': len(processor.input)}
+                for n, processor in enumerate(self.machines)]
+
+    def prometheus(self, snapshot):
+        metrics = [('instructions', 'intcode_instructions_total', 'counter', "Instructions executed"),
+                   ('blocked_seconds', 'intcode_blocked_seconds_total', 'counter', "Time spent waiting for input"),
+                   ('produced', 'intcode_values_produced_total', 'counter', "Values written to the output"),
+                   ('consumed', 'intcode_values_consumed_total', 'counter', "Values read from the input"),
+                   ('queue_depth', 'intcode_queue_depth', 'gauge', "Values waiting in the input queue")]
+        lines = []
+        for key, name, kind, help in metrics:
+            lines += [F"# HELP {name} {help}", F"# TYPE {name} {kind}"]
+            lines += [F'{name}{{machine="{machine["machine"]}"}} {machine[key]}' for machine in snapshot]
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        snapshot = self.snapshot()
+        self._last_export = time.perf_counter()
+        if self.format == 'jsonl':
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'time': time.time(), 'machines': snapshot}) + '\n')
+        else:
+            # scrapers should never see half a file
+            with open(self.path + '.tmp', 'w') as f:
+                f.write(self.prometheus(snapshot))
+            os.replace(self.path + '.tmp', self.path)
 
 def permutations(numbers):
     if len(numbers) == 0:
@@ -289,26 +487,34 @@ def run_amplifier_series(program, phase_setting_sequence):
 
     last_output = [0]
     for stage in range(5):
-        #poor mans deepcopy
-        memory = [n for n in program]
-        processor = IntcodeProcessor(memory, [phase_setting_sequence[stage]] + last_output)
-        while processor.Process() != 'HALT':
-            pass
+        # reset copies the program, so we don't have to
+        processor = POOL.acquire(program, [phase_setting_sequence[stage]] + last_output)
+        run_to_halt(processor)
         assert len(processor.output) == 1, "I think there should be exactly 1 output"
         last_output = processor.output
+        POOL.release([processor])
 
     return last_output[0]
 
-def run_amplifier_series_loop(program, phase_setting_sequence):
-    amplifiers = [IntcodeProcessor([n for n in program], [phase_setting_sequence[amp]]) for amp in range(5)]
+def run_amplifier_series_loop(program, phase_setting_sequence, telemetry = None):
+    amplifiers = [POOL.acquire(program, [phase_setting_sequence[amp]]) for amp in range(5)]
+    if telemetry is not None:
+        telemetry.watch(amplifiers)
     last_output = 0
     current_amp = 0
     while True:
         amp = amplifiers[current_amp]
         amp.input.append(last_output)
+        if telemetry is not None:
+            telemetry.resumed(current_amp)
         r = amp.Process()
         if r == 'HALT':
             #assert  current_amp == 4, "The story suggests that only the last amp should halt"
+            if telemetry is not None:
+                telemetry.finish()
+                if telemetry.path is not None:
+                    telemetry.export()
+            POOL.release(amplifiers)
             return last_output
         elif r == 'INPUT':
             assert False, "I don't think we should ever come here..."
@@ -316,6 +522,9 @@ def run_amplifier_series_loop(program, phase_setting_sequence):
         elif r == 'OUTPUT':
             last_output = amp.output[0]
             amp.output = amp.output[1:]
+            # it has to wait for the others to go round before its next input arrives
+            if telemetry is not None:
+                telemetry.blocked(current_amp)
             # switch to the next amp
             current_amp += 1
             current_amp %= 5
@@ -324,6 +533,158 @@ def run_amplifier_series_loop(program, phase_setting_sequence):
         assert False, "Ehm.. We shouldn't get here..."
 
 
+def _run_amplifier_series_on_image(phase_setting_sequence):
+    return run_amplifier_series(sharedimage.worker_image, phase_setting_sequence)
+
+def _run_amplifier_series_loop_on_image(phase_setting_sequence):
+    return run_amplifier_series_loop(sharedimage.worker_image, phase_setting_sequence)
+
+def max_thruster_signal_parallel(program, phases, feedback_loop = False, workers = None):
+    '''Tries all phase setting sequences on a pool of worker processes. The program goes into shared memory once,
+    so the tasks only have to send the phase settings'''
+    run = _run_amplifier_series_loop_on_image if feedback_loop else _run_amplifier_series_on_image
+    with sharedimage.SharedProgramImage.create(program) as image:
+        with multiprocessing.Pool(workers, sharedimage.attach_worker, (image.name, len(image))) as pool:
+            return max(pool.map(run, permutations(phases)))
+
+class DeadlockError(Exception):
+    pass
+
+def _send_batches(batches, outbox):
+    for batch in iter(batches.get, None):
+        outbox.send(batch)
+
+def _run_shard(program, phases, first, count, inbox, outbox, control, batch_size):
+    '''Runs machines first .. first + count - 1 of a feedback loop. The first machine gets its values from inbox and
+    the outputs of the last one go to outbox, in batches of up to batch_size values. Every time we run out of work
+    we tell the coordinator how many values we have sent and received so far.
+
+    A pipe only holds so much, so two shards that both send more than that before they read would wait for each
+    other forever. That's why a thread does the sending, and we pick up whatever came in between batches.'''
+    machines = [IntcodeProcessor(program[:], [phases[first + n]]) for n in range(count)]
+    if first == 0:
+        machines[0].input.append(0)
+    status = [None] * count
+    sent = received = 0
+    last_output = None
+    batch = []
+    batches = queue.Queue()
+    threading.Thread(target=_send_batches, args=(batches, outbox), daemon=True).start()
+
+    def receive():
+        nonlocal received
+        values = inbox.recv()
+        received += len(values)
+        machines[0].input.extend(values)
+
+    try:
+        while True:
+            progress = True
+            while progress:
+                progress = False
+                for n, machine in enumerate(machines):
+                    if status[n] == 'HALT' or (status[n] == 'INPUT' and not machine.input):
+                        continue
+                    status[n] = machine.Process()
+                    while status[n] == 'OUTPUT':
+                        status[n] = machine.Process()
+                    progress = True
+                    outputs, machine.output = machine.output, []
+                    if n + 1 < count:
+                        machines[n + 1].input.extend(outputs)
+                    elif outputs:
+                        last_output = outputs[-1]
+                        batch.extend(outputs)
+                    while len(batch) >= batch_size:
+                        batches.put(batch[:batch_size])
+                        sent += batch_size
+                        batch = batch[batch_size:]
+                        while inbox.poll():
+                            receive()
+            if batch:
+                batches.put(batch)
+                sent += len(batch)
+                batch = []
+
+            control.send(('idle', sent, received, all(s == 'HALT' for s in status), last_output))
+            while True:
+                ready = multiprocessing.connection.wait([inbox, control])
+                if control in ready:
+                    message = control.recv()
+                    if message == 'stop':
+                        return
+                    control.send(('probe', sent, received, all(s == 'HALT' for s in status), last_output))
+                if inbox in ready:
+                    receive()
+                    break
+    except Exception as e:
+        control.send(('error', repr(e)))
+
+def run_amplifier_network(program, phase_setting_sequence, shards = None, batch_size = 64):
+    '''Runs a feedback loop of any number of amplifiers on shards worker processes, every shard running a
+    consecutive group of them. Values between shards go through pipes, in batches. Returns the last output of the
+    last amplifier once all of them have halted, or raises a DeadlockError when they are all waiting for input
+    that will never come.
+
+    The shards report how many values they sent and received every time they go idle. When all of them are idle
+    and the counts add up, nothing is in flight, but a shard could have picked up work again after its report. So
+    we ask everybody again, and only if nobody's counts changed in between do we know the network is done.'''
+    shards = min(shards or multiprocessing.cpu_count(), len(phase_setting_sequence))
+    bounds = [len(phase_setting_sequence) * n // shards for n in range(shards + 1)]
+    # channel n feeds the first amplifier of shard n
+    channels = [multiprocessing.Pipe(duplex=False) for _ in range(shards)]
+    controls = [multiprocessing.Pipe() for _ in range(shards)]
+    processes = []
+    for n in range(shards):
+        process = multiprocessing.Process(target=_run_shard, daemon=True,
+                                          args=(program, phase_setting_sequence, bounds[n], bounds[n + 1] - bounds[n],
+                                                channels[n][0], channels[(n + 1) % shards][1], controls[n][1], batch_size))
+        process.start()
+        processes.append(process)
+    coordinator = [control[0] for control in controls]
+
+    def receive(shard):
+        report = coordinator[shard].recv()
+        if report[0] == 'error':
+            raise RuntimeError(F"Shard {shard} failed: {report[1]}")
+        return report
+
+    reports = [None] * shards
+    try:
+        while True:
+            if None in reports or sum(report[1] for report in reports) != sum(report[2] for report in reports):
+                for connection in multiprocessing.connection.wait(coordinator):
+                    shard = coordinator.index(connection)
+                    reports[shard] = receive(shard)
+                continue
+
+            for connection in coordinator:
+                connection.send('probe')
+            probes = []
+            for shard in range(shards):
+                report = receive(shard)
+                while report[0] != 'probe':
+                    report = receive(shard)
+                probes.append(report)
+            if [probe[1:] for probe in probes] != [report[1:] for report in reports]:
+                reports = probes
+                continue
+
+            if all(report[3] for report in reports):
+                return reports[-1][4]
+            waiting = [n for n in range(shards) if not reports[n][3]]
+            raise DeadlockError(F"The amplifiers on shards {waiting} are waiting for input that never comes")
+    finally:
+        for connection in coordinator:
+            try:
+                connection.send('stop')
+            except OSError:
+                pass
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
 def puzzle1():
     with open('input.txt') as f:
         input =  [int(n) for n in f.read().split(',')]
@@ -338,5 +699,6 @@ def puzzle2():
         thruster_signals = [run_amplifier_series_loop(input, sequence) for sequence in phase_setting_sequences]
         return max(thruster_signals)
 
-print(F'The solution to puzzle one is {puzzle1()}')
-print(F'The solution to puzzle one is {puzzle2()}')
\ No newline at end of file
+if __name__ == "__main__":
+    print(F'The solution to puzzle one is {puzzle1()}')
+    print(F'The solution to puzzle one is {puzzle2()}')
@@ -1,3 +1,7 @@
+import mmap
+import unittest
+import numpy as np
+
 def digits_to_layers(digits, width, height):
     pointer = 0
     layers = []
@@ -8,12 +12,98 @@ def digits_to_layers(digits, width, height):
 
     return layers
 
-def puzzle1(input):
-    layers = digits_to_layers(input, 25, 6)
-    zeroes = [layer.count('0') for layer in layers]
-    layer_with_min_zeroes = zeroes.index(min(zeroes))
-    result = layers[layer_with_min_zeroes].count('1') * layers[layer_with_min_zeroes].count('2')
-    return result
+def decode_image(digits, width, height):
+    '''Returns the image as a (layers, height, width) array of pixel values'''
+    pixels = np.frombuffer(digits.strip().encode('ascii'), dtype=np.uint8) - ord('0')
+    assert pixels.size % (width * height) == 0, F"{pixels.size} digits can't be split into {width}x{height} layers"
+    return pixels.reshape(-1, height, width)
+
+def layer_statistics(layers):
+    '''Returns a (layers, 3) array with the number of 0, 1 and 2 digits in each layer'''
+    count = layers.shape[0]
+    # give every layer its own range of 3 bins, so one bincount counts all of them
+    bins = layers.reshape(count, -1) + 3 * np.arange(count)[:, None]
+    return np.bincount(bins.ravel(), minlength=3 * count).reshape(count, 3)
+
+def checksum(statistics):
+    layer_with_min_zeroes = statistics[:, 0].argmin()
+    return int(statistics[layer_with_min_zeroes, 1]) * int(statistics[layer_with_min_zeroes, 2])
+
+def composite(layers):
+    '''Returns the (height, width) image you get by stacking the layers, first layer in front'''
+    opaque = layers != 2
+    assert opaque.any(axis=0).all(), "We should not get here. That means that none of the layers have a pixel here.."
+    front = opaque.argmax(axis=0)
+    return np.take_along_axis(layers, front[np.newaxis], axis=0)[0]
+
+def render(image):
+    return '\n'.join(''.join("█" if pixel == 0 else '░' for pixel in row) for row in image)
+
+def stream_layers(path, width, height):
+    '''Memory maps the image file and yields it one flat layer at a time'''
+    layer_size = width * height
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) < layer_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as digits:
+            # anything after the last full layer is trailing whitespace
+            for start in range(0, len(digits) - layer_size + 1, layer_size):
+                yield np.frombuffer(digits, dtype=np.uint8, count=layer_size, offset=start) - ord('0')
+
+def decode_file(path, width = 25, height = 6, statistics = True):
+    '''Computes the checksum and the composite image in a single pass over the file, holding only one layer in memory.
+    Without statistics we stop reading as soon as every pixel of the composite is known and return None as checksum.'''
+    image = np.full(width * height, 2, dtype=np.uint8)
+    fewest_zeroes = None
+    for layer in stream_layers(path, width, height):
+        if statistics:
+            zeroes, ones, twos = np.bincount(layer, minlength=3)[:3]
+            if fewest_zeroes is None or zeroes < fewest_zeroes:
+                fewest_zeroes = zeroes
+                result = int(ones) * int(twos)
+
+        transparent = image == 2
+        image[transparent] = layer[transparent]
+        if not statistics and (image != 2).all():
+            break
+
+    assert (image != 2).all(), "We should not get here. That means that none of the layers have a pixel here.."
+    return (result if statistics else None), image.reshape(height, width)
+
+# Every pixel is one bit in two planes: opaque (not 2) and color (1). The first pixel is the most significant bit.
+OPAQUE_PLANE = str.maketrans('012', '110')
+COLOR_PLANE = str.maketrans('012', '010')
+
+def layer_to_bitplanes(layer):
+    return int(layer.translate(OPAQUE_PLANE), 2), int(layer.translate(COLOR_PLANE), 2)
+
+def digits_to_bitplanes(digits, width, height):
+    return [layer_to_bitplanes(layer) for layer in digits_to_layers(digits.strip(), width, height)]
+
+def bitplane_statistics(opaque, color, layer_size):
+    '''Returns the number of 0, 1 and 2 digits in the layer'''
+    ones = color.bit_count()
+    opaque_pixels = opaque.bit_count()
+    return opaque_pixels - ones, ones, layer_size - opaque_pixels
+
+def composite_bitplanes(planes, layer_size):
+    '''Stacks the layers on a whole plane at a time. Returns the color plane of the composite'''
+    all_pixels = (1 << layer_size) - 1
+    resolved = 0
+    image = 0
+    for opaque, color in planes:
+        image |= color & ~resolved
+        resolved |= opaque
+        if resolved == all_pixels:
+            return image
+    assert False, "We should not get here. That means that none of the layers have a pixel here.."
+
+def render_bitplane(image, width, height):
+    pixels = format(image, F'0{width * height}b').translate(str.maketrans('01', '█░'))
+    return '\n'.join(pixels[r * width : (r + 1) * width] for r in range(height))
+
+def puzzle1(input, width = 25, height = 6):
+    return checksum(layer_statistics(decode_image(input, width, height)))
 
 def get_pixel_value(pixel, layers):
     for layer in layers:
@@ -34,15 +124,61 @@ def stack_layers(input, width, height):
     #print(image)
     return image
 
-def puzzle2(input):
-    image = stack_layers(input, 25, 6)
-    image = ''.join(image)
-    rows = [image[r*25:(r+1)*25] for r in range(6)]
-    return '\n'.join(rows)
+def puzzle2(input, width = 25, height = 6):
+    return render(composite(decode_image(input, width, height)))
+
+class Day8UnitTests(unittest.TestCase):
+    def test_decode_image(self):
+        layers = decode_image("123456789012", 3, 2)
+        self.assertEqual(layers.shape, (2, 2, 3))
+        self.assertEqual(layers[1].tolist(), [[7, 8, 9], [0, 1, 2]])
+
+    def test_layer_statistics(self):
+        statistics = layer_statistics(decode_image("0222112222120000", 2, 2))
+        self.assertEqual(statistics.tolist(), [[1, 0, 3], [0, 2, 2], [0, 1, 3], [4, 0, 0]])
+        self.assertEqual(checksum(statistics), 4)
+
+    def test_composite(self):
+        '''given an image 2 pixels wide and 2 pixels tall, the image data 0222112222120000 ...
+        So, the final image looks like this:
+        01
+        10'''
+        self.assertEqual(composite(decode_image("0222112222120000", 2, 2)).tolist(), [[0, 1], [1, 0]])
+        self.assertEqual(puzzle2("0222112222120000", 2, 2), "█░\n░█")
+
+    def test_input(self):
+        with open('input.txt') as f:
+            i = f.read()
+        self.assertEqual(puzzle1(i), 2562)
+        self.assertEqual(''.join(puzzle2(i).split('\n')), ''.join(stack_layers(i, 25, 6)))
+
+    def test_bitplanes(self):
+        planes = digits_to_bitplanes("0222112222120000", 2, 2)
+        self.assertEqual(planes[0], (0b1000, 0b0000))
+        self.assertEqual(planes[1], (0b1100, 0b1100))
+        self.assertEqual([bitplane_statistics(opaque, color, 4) for opaque, color in planes], [(1, 0, 3), (0, 2, 2), (0, 1, 3), (4, 0, 0)])
+        self.assertEqual(render_bitplane(composite_bitplanes(planes, 4), 2, 2), "█░\n░█")
 
+    def test_bitplanes_input(self):
+        with open('input.txt') as f:
+            i = f.read()
+        planes = digits_to_bitplanes(i, 25, 6)
+        statistics = [bitplane_statistics(opaque, color, 150) for opaque, color in planes]
+        self.assertEqual(checksum(np.array(statistics)), 2562)
+        self.assertEqual(render_bitplane(composite_bitplanes(planes, 150), 25, 6), puzzle2(i))
 
+    def test_decode_file(self):
+        with open('input.txt') as f:
+            i = f.read()
+        result, image = decode_file('input.txt')
+        self.assertEqual(result, 2562)
+        self.assertEqual(render(image), puzzle2(i))
+        result, image = decode_file('input.txt', statistics=False)
+        self.assertIsNone(result)
+        self.assertEqual(render(image), puzzle2(i))
 
-with open('input.txt') as f:
-    i = f.read()
-    print(F"The result of puzzle 1 is {puzzle1(i)}")
-    print(F"The result of puzzle 1 is \n{puzzle2(i)}")
\ No newline at end of file
+if __name__ == "__main__":
+    with open('input.txt') as f:
+        i = f.read()
+        print(F"The result of puzzle 1 is {puzzle1(i)}")
+        print(F"The result of puzzle 1 is \n{puzzle2(i)}")
\ No newline at end of file
@@ -0,0 +1,185 @@
+'''A result cache for Intcode runs. A run is deterministic given the program and its input, so we key results by a
+hash of both and keep what the run ended with: the status, the outputs, the memory cells that changed and the number
+of steps. Results live in an LRU dict, and optionally also as json files in a directory, so they survive the process.
+
+While running we stop at every input instruction and also keep the state the machine was in, keyed by the hash of
+the program and the inputs it had consumed so far. A run whose input starts with the same values as an earlier one
+then continues from the longest prefix we have a state for, instead of from the start.'''
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from day9 import IntcodeProcessor
+from fastprocessor import FastIntcodeProcessor
+
+Result = collections.namedtuple('Result', 'status output memory steps')
+
+def changed_cells(program, memory):
+    return {address: value for address, (value, original) in enumerate(zip(memory, program)) if value != original}
+
+class ResultCache:
+    def __init__(self, capacity = 1 << 12, directory = None, engine = FastIntcodeProcessor):
+        self.capacity = capacity
+        self.directory = directory
+        self.engine = engine
+        self.hits = 0
+        self.misses = 0
+        self.resumed = 0
+        self._entries = collections.OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + '.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    entry = json.load(f)
+                self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _put(self, key, entry):
+        self._remember(key, entry)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + '.json')
+            # write to a temporary file first, so a concurrent reader never sees half an entry
+            temporary = F"{path}.{os.getpid()}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temporary, path)
+
+    def _snapshot(self, program, state):
+        return {'memory': list(changed_cells(program, state.memory).items()), 'instruction_pointer': state.instruction_pointer,
+                'relative_base': state.relative_base, 'steps': state.steps, 'output': state.output[:]}
+
+    def _restore(self, program, snapshot):
+        processor = self.engine(program[:], [])
+        for address, value in snapshot['memory']:
+            processor.state.memory[address] = value
+        processor.state.instruction_pointer = snapshot['instruction_pointer']
+        processor.state.relative_base = snapshot['relative_base']
+        processor.state.steps = snapshot['steps']
+        processor.state.output = list(snapshot['output'])
+        return processor
+
+    def run(self, program, input = []):
+        '''Returns the Result of running program with input, until it halts or needs more input than that'''
+        hash = hashlib.sha256(','.join(str(n) for n in program).encode('ascii') + b'|')
+        # prefixes[k] is the key of the state after consuming the first k inputs
+        prefixes = [hash.hexdigest()]
+        for value in input:
+            hash.update(b'%d,' % value)
+            prefixes.append(hash.hexdigest())
+
+        cached = self._get('result-' + prefixes[-1])
+        if cached is not None:
+            self.hits += 1
+            return Result(cached['status'], list(cached['output']), dict(cached['memory']), cached['steps'])
+        self.misses += 1
+
+        consumed = 0
+        processor = None
+        for k in range(len(input), -1, -1):
+            snapshot = self._get('state-' + prefixes[k])
+            if snapshot is not None:
+                processor, consumed = self._restore(program, snapshot), k
+                self.resumed += 1
+                break
+        if processor is None:
+            processor = self.engine(program[:], [])
+
+        while True:
+            status = processor.Process()
+            if status != 'INPUT':
+                break
+            key = 'state-' + prefixes[consumed]
+            if self._get(key) is None:
+                self._put(key, self._snapshot(program, processor.state))
+            if consumed == len(input):
+                break
+            processor.state.input.append(input[consumed])
+            consumed += 1
+
+        state = processor.state
+        memory = changed_cells(program, state.memory)
+        self._put('result-' + prefixes[-1], {'status': status, 'output': state.output[:], 'memory': list(memory.items()), 'steps': state.steps})
+        return Result(status, state.output[:], memory, state.steps)
+
+def run_amplifier_series(cache, program, phases):
+    '''day 7: in a sweep over all phase settings the same stage runs with the same inputs over and over'''
+    signal = 0
+    for phase in phases:
+        signal = cache.run(program, [phase, signal]).output[-1]
+    return signal
+
+class ResultCacheTests(unittest.TestCase):
+    # adds up three inputs and outputs the sum after every one of them
+    SUMS = [3, 16, 1, 16, 17, 17, 4, 17, 1001, 18, -1, 18, 1005, 18, 0, 99, 0, 0, 3]
+
+    def test_repeated_run(self):
+        cache = ResultCache()
+        first = cache.run(self.SUMS, [1, 2, 3])
+        self.assertEqual(first.output, [1, 3, 6])
+        self.assertEqual((first.status, first.memory[17], first.memory[18]), ('HALT', 6, 0))
+        self.assertEqual(cache.run(self.SUMS, [1, 2, 3]), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_resume_from_prefix(self):
+        cache = ResultCache()
+        cache.run(self.SUMS, [1, 2, 3])
+        result = cache.run(self.SUMS, [1, 2, 10])
+        self.assertEqual(cache.resumed, 1)
+        self.assertEqual(result.output, [1, 3, 13])
+        reference = IntcodeProcessor(self.SUMS[:], [1, 2, 10])
+        reference.Process()
+        self.assertEqual(result.steps, reference.state.steps)
+        self.assertEqual(result.memory, changed_cells(self.SUMS, reference.state.memory))
+        # not enough input
+        self.assertEqual(cache.run(self.SUMS, [1]).status, 'INPUT')
+
+    def test_lru(self):
+        cache = ResultCache(capacity=2)
+        cache.run([4, 0, 99], [])
+        self.assertEqual(len(cache._entries), 1)
+        cache.run([104, 1, 99], [])
+        cache.run([104, 2, 99], [])
+        self.assertEqual(len(cache._entries), 2)
+        cache.run([4, 0, 99], [])
+        self.assertEqual(cache.misses, 4)
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open('input.txt') as f:
+                program = [int(n) for n in f.read().split(',')] + [0] * 10**3
+            self.assertEqual(ResultCache(directory=directory).run(program, [2]).output, [66772])
+            cache = ResultCache(directory=directory)
+            self.assertEqual(cache.run(program, [2]).output, [66772])
+            self.assertEqual(cache.hits, 1)
+
+    def test_day5_and_amplifiers(self):
+        cache = ResultCache()
+        with open('../day5/input.txt') as f:
+            program = [int(n) for n in f.read().split(',')]
+        self.assertEqual(cache.run(program, [5]).output, [5893654])
+        # both diagnostics start by reading their input, so the second one resumes from the state before it
+        self.assertEqual(cache.run(program, [1]).output[-1], 9219874)
+        self.assertEqual(cache.resumed, 1)
+
+        with open('../day7/input.txt') as f:
+            program = [int(n) for n in f.read().split(',')]
+        from itertools import permutations
+        cache = ResultCache()
+        self.assertEqual(max(run_amplifier_series(cache, program, phases) for phases in permutations(range(5))), 272368)
+        self.assertGreater(cache.hits, cache.misses)
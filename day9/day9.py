@@ -1,4 +1,7 @@
 import abc
+import collections
+import copy
+import time
 import unittest
 
 class Instruction(abc.ABC):
@@ -30,9 +33,10 @@ class Instruction(abc.ABC):
 
     def set_parameter(self, parameter, mode, memory, value, relative_base):
         assert mode == 0 or mode == 2, F"Unsupported parameter mode for storing: {mode}"
-        offset = parameter + relative_base
+        offset = parameter + relative_base if mode == 2 else parameter
         assert len(memory) > offset, F"Can't access location {offset} in memory with size {len(memory)}"
         memory[offset] = value
+        return offset
 
 class NullaryInstruction(Instruction):
     def __init__(self, opcode):
@@ -47,24 +51,27 @@ class BinaryInstruction(Instruction):
         super(BinaryInstruction, self).__init__(opcode, 2)
 
     def get_parameters(self, memory, startat, parameter_modes, relative_base):
-        self.parameter1 = super(BinaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory, relative_base)
-        self.parameter2 = super(BinaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory, relative_base)
+        parameter1 = super(BinaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory, relative_base)
+        parameter2 = super(BinaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory, relative_base)
+        return parameter1, parameter2
 
 class TernaryInstruction(Instruction):
     def __init__(self, opcode):
         super(TernaryInstruction, self).__init__(opcode, 3)
 
-    def store(self, value, memory):
-        assert len(memory) > self.parameter3, F"Can't access location {self.parameter3} in memory with size {len(memory)}"
-        memory[self.parameter3] = value
+    def store(self, address, value, machine_state):
+        memory = machine_state.memory
+        assert len(memory) > address, F"Can't access location {address} in memory with size {len(memory)}"
+        memory[address] = value
+        if machine_state.dirty is not None:
+            machine_state.dirty.add(address >> PAGE_BITS)
 
     def get_parameters(self, memory, startat, parameter_modes, relative_base):
-        self.parameter1 = super(TernaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory, relative_base)
-        self.parameter2 = super(TernaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory, relative_base)
-        if parameter_modes[2] == 0:
-            self.parameter3 = memory[startat + 2]
-        elif parameter_modes[2] == 2:
-            self.parameter3 = memory[startat + 2] + relative_base
+        parameter1 = super(TernaryInstruction, self).get_parameter(memory[startat], parameter_modes[0], memory, relative_base)
+        parameter2 = super(TernaryInstruction, self).get_parameter(memory[startat + 1], parameter_modes[1], memory, relative_base)
+        assert parameter_modes[2] == 0 or parameter_modes[2] == 2, F"Unsupported parameter mode for storing: {parameter_modes[2]}"
+        parameter3 = memory[startat + 2] + relative_base if parameter_modes[2] == 2 else memory[startat + 2]
+        return parameter1, parameter2, parameter3
 
 
 
@@ -73,8 +80,8 @@ class InstructionAdd(TernaryInstruction):
         super(InstructionAdd, self).__init__(1)
 
     def process(self, machine_state, parameter_modes):
-        super(InstructionAdd, self).get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        super(InstructionAdd, self).store(self.parameter1 + self.parameter2, machine_state.memory)
+        parameter1, parameter2, parameter3 = super(InstructionAdd, self).get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        super(InstructionAdd, self).store(parameter3, parameter1 + parameter2, machine_state)
         machine_state.instruction_pointer += self.parameter_count()
 
 
@@ -83,8 +90,8 @@ class InstructionMultiply(TernaryInstruction):
         super(InstructionMultiply, self).__init__(2)
 
     def process(self, machine_state, parameter_modes):
-        super(InstructionMultiply, self).get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        super(InstructionMultiply, self).store(self.parameter1 * self.parameter2, machine_state.memory)
+        parameter1, parameter2, parameter3 = super(InstructionMultiply, self).get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        super(InstructionMultiply, self).store(parameter3, parameter1 * parameter2, machine_state)
         machine_state.instruction_pointer += self.parameter_count()
 
 class InstructionStore(UnaryInstruction):
@@ -95,8 +102,10 @@ class InstructionStore(UnaryInstruction):
         param = super(InstructionStore, self).get_parameter(machine_state.memory[machine_state.instruction_pointer], parameter_modes[0], machine_state.memory, machine_state.relative_base)
         assert len(machine_state.input) > 0, "Input function called but there is no input"
         value = machine_state.input[0]
-        input_function = machine_state.input[1:]
-        super(InstructionStore, self).set_parameter(machine_state.memory[machine_state.instruction_pointer], parameter_modes[0], machine_state.memory, value, machine_state.relative_base)
+        machine_state.input = machine_state.input[1:]
+        offset = super(InstructionStore, self).set_parameter(machine_state.memory[machine_state.instruction_pointer], parameter_modes[0], machine_state.memory, value, machine_state.relative_base)
+        if machine_state.dirty is not None:
+            machine_state.dirty.add(offset >> PAGE_BITS)
 
         machine_state.instruction_pointer += self.parameter_count()
 
@@ -114,9 +123,9 @@ class InstructionJumpIfTrue(BinaryInstruction):
         super(InstructionJumpIfTrue, self).__init__(5)
 
     def process(self, machine_state, parameter_modes):
-        self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        if(self.parameter1 != 0):
-            machine_state.instruction_pointer = self.parameter2
+        parameter1, parameter2 = self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        if(parameter1 != 0):
+            machine_state.instruction_pointer = parameter2
         else:
             machine_state.instruction_pointer += self.parameter_count()
 
@@ -125,9 +134,9 @@ class InstructionJumpIfFalse(BinaryInstruction):
         super(InstructionJumpIfFalse, self).__init__(6)
 
     def process(self, machine_state, parameter_modes):
-        self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        if(self.parameter1 == 0):
-            machine_state.instruction_pointer = self.parameter2
+        parameter1, parameter2 = self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        if(parameter1 == 0):
+            machine_state.instruction_pointer = parameter2
         else:
             machine_state.instruction_pointer += self.parameter_count()
 
@@ -136,8 +145,8 @@ class InstructionLessThen(TernaryInstruction):
         super(InstructionLessThen, self).__init__(7)
 
     def process(self, machine_state, parameter_modes):
-        self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        super(InstructionLessThen, self).store(1 if self.parameter1 < self.parameter2 else 0, machine_state.memory)
+        parameter1, parameter2, parameter3 = self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        super(InstructionLessThen, self).store(parameter3, 1 if parameter1 < parameter2 else 0, machine_state)
 
         machine_state.instruction_pointer += self.parameter_count()
 
@@ -146,8 +155,8 @@ class InstructionEquals(TernaryInstruction):
         super(InstructionEquals, self).__init__(8)
 
     def process(self, machine_state, parameter_modes):
-        self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
-        super(InstructionEquals, self).store(1 if self.parameter1 == self.parameter2 else 0, machine_state.memory)
+        parameter1, parameter2, parameter3 = self.get_parameters(machine_state.memory, machine_state.instruction_pointer, parameter_modes, machine_state.relative_base)
+        super(InstructionEquals, self).store(parameter3, 1 if parameter1 == parameter2 else 0, machine_state)
 
         machine_state.instruction_pointer += self.parameter_count()
 
@@ -169,6 +178,59 @@ class InstructionHalt(NullaryInstruction):
         machine_state.instruction_pointer += self.parameter_count()
 
 
+# The instructions don't keep state between calls, so every processor can share the same dispatch table
+OPERATIONS = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply(), InstructionHalt(), InstructionStore(), InstructionLoad(), InstructionJumpIfFalse(), InstructionJumpIfTrue(), InstructionLessThen(), InstructionEquals(), InstructionAdjustRelativeBase() ]}
+
+# how often Process looks at the clock when it has a quantum
+CHECK_STEPS = 4096
+# memory is hashed in pages of 1 << PAGE_BITS cells
+PAGE_BITS = 10
+
+class LoopDetector:
+    '''Remembers a hash of the machine state every interval instructions. Intcode is deterministic, so once a
+    program is back in a state it was in before, without having read or written anything since, it will go round
+    the same loop forever. The state includes how much input is left and how much output there is, so a loop that
+    reads input or produces output still counts as progress.
+    The memory is hashed per page. The engines add the pages they write to state.dirty, so at every checkpoint we
+    only hash the pages that changed since the last one. We remember the last capacity hashes.'''
+    def __init__(self, interval = 1 << 14, capacity = 1 << 12):
+        self.interval = interval
+        self.capacity = capacity
+        self._seen = collections.OrderedDict()
+        self._state = None
+        self._pages = []
+        self._digest = 0
+
+    def _hash_page(self, memory, page):
+        return hash((page, tuple(memory[page << PAGE_BITS : (page + 1) << PAGE_BITS])))
+
+    def _memory_digest(self, state):
+        memory = state.memory
+        pages = (len(memory) >> PAGE_BITS) + 1
+        # dirty is None when nobody has been keeping track, after a reset or for a state we haven't seen yet
+        if self._state is not state or state.dirty is None or len(self._pages) != pages or any(not 0 <= page < pages for page in state.dirty):
+            self._state = state
+            self._pages = [self._hash_page(memory, page) for page in range(pages)]
+            self._digest = 0
+            for page in self._pages:
+                self._digest ^= page
+        else:
+            for page in state.dirty:
+                digest = self._hash_page(memory, page)
+                self._digest ^= self._pages[page] ^ digest
+                self._pages[page] = digest
+        state.dirty = set()
+        return self._digest
+
+    def seen(self, state):
+        key = hash((state.instruction_pointer, state.relative_base, len(state.input), len(state.output), self._memory_digest(state)))
+        if key in self._seen:
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+        return False
+
 class IntcodeProcessor:
     class State:
         def __init__(self):
@@ -177,22 +239,75 @@ class IntcodeProcessor:
             self.memory = []
             self.instruction_pointer = 0
             self.relative_base = 0
+            self.steps = 0
+            # the memory pages written since a LoopDetector last looked, or None when nobody is looking
+            self.dirty = None
 
     def __init__(self, program, input = []):
-        self.operations = {operation.opcode() : operation for operation in [InstructionAdd(), InstructionMultiply(), InstructionHalt(), InstructionStore(), InstructionLoad(), InstructionJumpIfFalse(), InstructionJumpIfTrue(), InstructionLessThen(), InstructionEquals(), InstructionAdjustRelativeBase() ]}
+        self.operations = OPERATIONS
         self.state = self.State()
         self.state.input = input
         self.state.memory = program
 
-    def Process(self):
+    def reset(self, program, input = []):
+        '''Get ready to run program from the start. Unlike the constructor this copies the program into the memory
+        we already have, so the caller doesn't have to make a copy and we don't allocate a new list'''
+        self.state.memory[:] = program
+        self.state.input = list(input)
+        self.state.output = []
+        self.state.instruction_pointer = 0
+        self.state.relative_base = 0
+        self.state.steps = 0
+        self.state.dirty = None
+
+    def fork(self, input = []):
+        '''Returns a copy of this processor that continues from the same state, but on its own memory, with input
+        added to what is still left of ours'''
+        child = copy.copy(self)
+        child.state = copy.copy(self.state)
+        child.state.memory = self.state.memory[:]
+        child.state.input = self.state.input + list(input)
+        child.state.output = self.state.output[:]
+        child.state.dirty = None
+        return child
+
+    def Process(self, max_steps = None, quantum = None, detector = None):
+        '''Runs until the program halts, returns 'INPUT' when it needs input we don't have, or 'PREEMPTED' after
+        max_steps instructions or quantum seconds. Calling Process again continues where we left off.
+        With a LoopDetector we return 'LOOP' as soon as the program is back in a state it was in before'''
+        if quantum is None and detector is None:
+            return self._run(max_steps)
+        stop_at = None if max_steps is None else self.state.steps + max_steps
+        deadline = None if quantum is None else time.perf_counter() + quantum
+        interval = CHECK_STEPS if detector is None else detector.interval
         while True:
+            # check on whole multiples of the interval, so a loop ends up at the same checkpoints every time round
+            budget = interval - self.state.steps % interval
+            if stop_at is not None:
+                budget = min(budget, stop_at - self.state.steps)
+            status = self._run(budget)
+            if status != 'PREEMPTED' or self.state.steps == stop_at:
+                return status
+            if detector is not None and detector.seen(self.state):
+                return 'LOOP'
+            if deadline is not None and time.perf_counter() >= deadline:
+                return 'PREEMPTED'
+
+    def _run(self, max_steps = None):
+        stop_at = None if max_steps is None else self.state.steps + max_steps
+        while True:
+            if self.state.steps == stop_at:
+                return 'PREEMPTED'
             opcode, parameter_modes = self.split_instruction(self.state.memory[self.state.instruction_pointer])
             if opcode == 99:
                 return 'HALT'
+            if opcode == 3 and not self.state.input:
+                return 'INPUT'
 
             self.state.instruction_pointer += 1
             assert opcode in self.operations, F"Unknown opcode {opcode}"
             self.operations[opcode].process(self.state, parameter_modes)
+            self.state.steps += 1
 
 
     def get_input(self):
@@ -213,10 +328,48 @@ class IntcodeProcessor:
         parameter_modes += ([0] *(parameter_count - len(parameter_modes)))
         return (opcode, parameter_modes)
 
+class ProcessorPool:
+    '''Processors that are done can be handed back to the pool, so the next run can reset them instead of building new ones'''
+    def __init__(self, engine = IntcodeProcessor):
+        self.engine = engine
+        self._free = []
+
+    def acquire(self, program, input = []):
+        processor = self._free.pop() if self._free else self.engine([])
+        processor.reset(program, input)
+        return processor
+
+    def release(self, processors):
+        self._free.extend(processors)
+
+def run_with_inputs(program, input_vectors, processor = IntcodeProcessor):
+    '''Runs program once for every input vector and returns (status, output) for each of them. The vectors are
+    handed out one value at a time: everything up to an input instruction only runs once for all vectors that
+    agree on the inputs so far, and we only fork the processor where they start to differ'''
+    results = [None] * len(input_vectors)
+    # a processor, how many inputs it has consumed, and the vectors it is running for
+    pending = [(processor(program[:], []), 0, list(range(len(input_vectors))))]
+    while pending:
+        proc, consumed, vectors = pending.pop()
+        status = proc.Process()
+        branches = {}
+        for vector in vectors:
+            if status == 'INPUT' and consumed < len(input_vectors[vector]):
+                branches.setdefault(input_vectors[vector][consumed], []).append(vector)
+            else:
+                results[vector] = (status, proc.state.output[:])
+        for n, (value, branch) in enumerate(branches.items()):
+            # the last branch can just continue on the processor we have
+            child = proc.fork([value]) if n < len(branches) - 1 else proc
+            if child is proc:
+                proc.state.input.append(value)
+            pending.append((child, consumed + 1, branch))
+    return results
+
 def run(intcodes):
     proc = IntcodeProcessor(intcodes + ([0] * 10**3))
-    while proc.Process() != 'HALT':
-        pass
+    status = proc.Process()
+    assert status == 'HALT', F"The program stopped with {status} instead of halting"
     return proc.state.memory[:len(intcodes)]
 
 class IntcodeProcessorTests(unittest.TestCase):
@@ -232,6 +385,12 @@ class IntcodeProcessorTests(unittest.TestCase):
         # mul
         self.assertEqual(run([1102, 5, 6, 3, 99, 25, 35]), [1102, 5, 6, 30, 99, 25, 35])
 
+    def test_shared_operations(self):
+        # processors on other threads share the same instructions, so they must not keep anything between calls
+        run([1101, 5, 6, 3, 1107, 1, 2, 9, 99, 0])
+        for operation in OPERATIONS.values():
+            self.assertEqual(set(vars(operation)), {'_opcode', '_parameter_count'})
+
     def test_split_oppcode(self):
         proc = IntcodeProcessor([])
         self.assertEqual(proc.split_instruction(1), (1,[0,0,0]))
@@ -253,8 +412,7 @@ class IntcodeProcessorTests(unittest.TestCase):
         with open('../day5/input.txt') as f:
             memory = [int(n) for n in f.read().split(',')]
             proc = IntcodeProcessor(memory, [1])
-            while proc.Process() != 'HALT':
-                pass
+            self.assertEqual(proc.Process(), 'HALT')
             self.assertTrue(all(v == 0 for v in proc.state.output[:-1]))
             self.assertEqual(proc.state.output[-1], 9219874)
 
@@ -262,8 +420,7 @@ class IntcodeProcessorTests(unittest.TestCase):
         with open('../day5/input.txt') as f:
             memory = [int(n) for n in f.read().split(',')]
             proc = IntcodeProcessor(memory, [5])
-            while proc.Process() != 'HALT':
-                pass
+            self.assertEqual(proc.Process(), 'HALT')
             self.assertEqual(proc.state.output, [5893654])
 
     def test_day9_puzzle1(self):
@@ -282,6 +439,121 @@ class IntcodeProcessorTests(unittest.TestCase):
             proc.Process()
             self.assertEqual(proc.state.output[-1], 66772)
 
+    def test_max_steps(self):
+        # loops forever
+        proc = IntcodeProcessor([1001, 7, 1, 7, 1105, 1, 0, 0])
+        self.assertEqual(proc.Process(max_steps=10), 'PREEMPTED')
+        self.assertEqual(proc.state.steps, 10)
+        self.assertEqual(proc.state.memory[7], 5)
+        self.assertEqual(proc.Process(max_steps=11), 'PREEMPTED')
+        self.assertEqual(proc.state.memory[7], 11)
+        proc = IntcodeProcessor([1101, 1, 0, 0, 99])
+        self.assertEqual(proc.Process(max_steps=10), 'HALT')
+        self.assertEqual(proc.state.steps, 1)
+
+    def test_multiple_inputs(self):
+        # every input instruction takes the next input
+        proc = IntcodeProcessor([3, 11, 3, 12, 1, 11, 12, 13, 4, 13, 99, 0, 0, 0], [20, 22])
+        proc.Process()
+        self.assertEqual(proc.state.output, [42])
+
+    def test_quantum(self):
+        # loops forever, but every time round the counter in memory[7] goes up
+        proc = IntcodeProcessor([1001, 7, 1, 7, 1105, 1, 0, 0])
+        start = time.perf_counter()
+        self.assertEqual(proc.Process(quantum=0.05), 'PREEMPTED')
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertGreater(proc.state.steps, 0)
+        steps = proc.state.steps
+        self.assertEqual(proc.Process(max_steps=10, quantum=10), 'PREEMPTED')
+        self.assertEqual(proc.state.steps, steps + 10)
+
+    def test_loop_detector(self):
+        # jumps to itself
+        proc = IntcodeProcessor([1105, 1, 0])
+        self.assertEqual(proc.Process(detector=LoopDetector(100)), 'LOOP')
+        self.assertLessEqual(proc.state.steps, 200)
+        # counts forever, which never repeats a state, so only the budget stops it
+        proc = IntcodeProcessor([1001, 7, 1, 7, 1105, 1, 0, 0])
+        self.assertEqual(proc.Process(max_steps=10**4, detector=LoopDetector(100)), 'PREEMPTED')
+        # a loop that outputs something is making progress
+        proc = IntcodeProcessor([104, 1, 1105, 1, 0])
+        self.assertEqual(proc.Process(max_steps=10**3, detector=LoopDetector(10)), 'PREEMPTED')
+        # toggles memory[11] between 0 and 1, with a period that doesn't divide the interval
+        proc = IntcodeProcessor([1002, 11, -1, 11, 1001, 11, 1, 11, 1105, 1, 0, 0])
+        self.assertEqual(proc.Process(detector=LoopDetector(7)), 'LOOP')
+        # counts in a page far away from the code, so only the hash of that page changes
+        detector = LoopDetector(100, capacity=10)
+        proc = IntcodeProcessor([1001, 5000, 1, 5000, 1105, 1, 0] + [0] * 10**4)
+        self.assertEqual(proc.Process(max_steps=10**4, detector=detector), 'PREEMPTED')
+        self.assertEqual(len(detector._seen), 10)
+        # once it is reset the detector has to start over, the memory changed without anyone marking it
+        proc.reset([1105, 1, 0])
+        self.assertEqual(proc.Process(detector=detector), 'LOOP')
+        # with enough of everything the day9 program finishes as usual
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')] + [0] * 10**3
+        proc = IntcodeProcessor(memory, [1])
+        self.assertEqual(proc.Process(quantum=60, detector=LoopDetector()), 'HALT')
+        self.assertEqual(proc.state.output, [2890527621])
+
+    def test_run_without_input(self):
+        with self.assertRaises(AssertionError):
+            run([3, 0, 99])
+
+    def test_input_status(self):
+        proc = IntcodeProcessor([3, 9, 3, 10, 1, 9, 10, 11, 99, 0, 0, 0], [20])
+        self.assertEqual(proc.Process(), 'INPUT')
+        self.assertEqual(proc.state.instruction_pointer, 2)
+        proc.state.input.append(22)
+        self.assertEqual(proc.Process(), 'HALT')
+        self.assertEqual(proc.state.memory[11], 42)
+
+    def test_fork(self):
+        proc = IntcodeProcessor([3, 9, 3, 10, 1, 9, 10, 11, 99, 0, 0, 0], [20])
+        proc.Process()
+        child = proc.fork([1])
+        proc.state.input.append(2)
+        proc.Process()
+        child.Process()
+        self.assertEqual((proc.state.memory[11], child.state.memory[11]), (22, 21))
+        self.assertEqual(child.state.steps, proc.state.steps)
+
+    def test_run_with_inputs(self):
+        # outputs its first input and then its second input plus one, every input instruction counts as a step
+        program = [3, 13, 4, 13, 3, 14, 1001, 14, 1, 14, 4, 14, 99, 0, 0]
+        forks = []
+        class CountingProcessor(IntcodeProcessor):
+            def fork(self, input = []):
+                forks.append(input)
+                return super(CountingProcessor, self).fork(input)
+        results = run_with_inputs(program, [[1, 2], [1, 3], [4, 5], [1, 2], [6]], CountingProcessor)
+        self.assertEqual(results, [('HALT', [1, 3]), ('HALT', [1, 4]), ('HALT', [4, 6]), ('HALT', [1, 3]), ('INPUT', [6])])
+        # one fork at the first input for 1, 4 and 6, and one at the second input for 2 and 3
+        self.assertEqual(len(forks), 3)
+
+    def test_run_with_inputs_day5_day9(self):
+        with open('../day5/input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')]
+        (status1, output1), (status5, output5) = run_with_inputs(memory, [[1], [5]])
+        self.assertEqual((output1[-1], output5), (9219874, [5893654]))
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')] + [0] * 10**3
+        self.assertEqual(run_with_inputs(memory, [[1], [2]]), [('HALT', [2890527621]), ('HALT', [66772])])
+
+    def test_processor_pool(self):
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')] + [0] * 10**3
+        pool = ProcessorPool()
+        proc = pool.acquire(memory, [1])
+        proc.Process()
+        self.assertEqual(proc.state.output, [2890527621])
+        pool.release([proc])
+        proc = pool.acquire([109, 19, 204, -15, 99], [])
+        proc.Process()
+        self.assertEqual(proc.state.output, [99])
+        self.assertEqual(proc.state.relative_base, 19)
+
 
 
 def puzzle1(input):
@@ -0,0 +1,324 @@
+'''A faster Intcode engine with the same interface as day9.IntcodeProcessor. Instead of an Instruction object per
+opcode that splits the instruction word into a list of modes every time, instruction words are decoded once into
+(opcode, modes) tuples that are shared by all processors, and the operations are inlined in one loop. Since the
+cache is keyed by the instruction word and not by its address, self modifying code just decodes to another entry.'''
+import unittest
+from day9 import PAGE_BITS, IntcodeProcessor, LoopDetector, run_with_inputs
+
+PARAMETER_COUNTS = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1, 99: 0}
+DECODED = {}
+
+def decode(instruction):
+    decoded = DECODED.get(instruction)
+    if decoded is None:
+        opcode = instruction % 100
+        assert opcode in PARAMETER_COUNTS, F"Unknown opcode {opcode}"
+        modes = instruction // 100
+        decoded = (opcode, modes % 10, modes // 10 % 10, modes // 100 % 10)
+        assert all(mode in (0, 1, 2) for mode in decoded[1 : 1 + PARAMETER_COUNTS[opcode]]), F"Unsupported parameter mode in {instruction}"
+        DECODED[instruction] = decoded
+    return decoded
+
+class FastIntcodeProcessor(IntcodeProcessor):
+    def _run(self, max_steps = None):
+        state = self.state
+        memory = state.memory
+        ip = state.instruction_pointer
+        rb = state.relative_base
+        steps = state.steps
+        dirty = state.dirty
+        stop_at = None if max_steps is None else steps + max_steps
+        try:
+            while steps != stop_at:
+                instruction = memory[ip]
+                decoded = DECODED.get(instruction) or decode(instruction)
+                opcode, mode1, mode2, mode3 = decoded
+                if opcode == 99:
+                    return 'HALT'
+
+                if opcode == 9 or opcode == 4:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    if opcode == 9:
+                        rb += a
+                    else:
+                        state.output.append(a)
+                    ip += 2
+                elif opcode == 3:
+                    if not state.input:
+                        return 'INPUT'
+                    assert mode1 != 1, "Unsupported parameter mode for storing: 1"
+                    p = memory[ip + 1]
+                    if mode1 == 2:
+                        p += rb
+                    memory[p] = state.input[0]
+                    if dirty is not None:
+                        dirty.add(p >> PAGE_BITS)
+                    state.input = state.input[1:]
+                    ip += 2
+                else:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    p = memory[ip + 2]
+                    b = memory[p] if mode2 == 0 else p if mode2 == 1 else memory[rb + p]
+                    if opcode == 5:
+                        ip = b if a != 0 else ip + 3
+                    elif opcode == 6:
+                        ip = b if a == 0 else ip + 3
+                    else:
+                        assert mode3 != 1, "Unsupported parameter mode for storing: 1"
+                        p = memory[ip + 3]
+                        if mode3 == 2:
+                            p += rb
+                        if opcode == 1:
+                            memory[p] = a + b
+                        elif opcode == 2:
+                            memory[p] = a * b
+                        elif opcode == 7:
+                            memory[p] = 1 if a < b else 0
+                        else:
+                            memory[p] = 1 if a == b else 0
+                        if dirty is not None:
+                            dirty.add(p >> PAGE_BITS)
+                        ip += 4
+                steps += 1
+            return 'PREEMPTED'
+        finally:
+            state.instruction_pointer = ip
+            state.relative_base = rb
+            state.steps = steps
+
+# Superinstructions, sequences of two instructions that we execute as one. Their codes don't clash with opcodes
+COMPARE_BRANCH = 101    # 1007/1008 a,k,t followed by 1005/1006 t,target
+COUNT_LOOP = 102        # 1001 x,k,x followed by 1005 x,target
+RELATIVE_LOAD = 103     # 109 d followed by 204 offset
+
+def fuse(memory, address):
+    '''Returns the superinstruction that starts at address and the number of cells it covers, or None'''
+    instruction = memory[address]
+    cells = memory[address : address + 7]
+    if instruction in (1007, 1008) and len(cells) == 7 and cells[4] in (1005, 1006) and cells[5] == cells[3]:
+        # if the compare writes into the branch we have to run them one at a time
+        if not address <= cells[3] < address + 7:
+            return (COMPARE_BRANCH, cells[1], cells[2], cells[3], instruction == 1007, cells[4] == 1005, cells[6]), 7
+    elif instruction == 1001 and len(cells) == 7 and cells[3] == cells[1] and cells[4] == 1005 and cells[5] == cells[1]:
+        if not address <= cells[1] < address + 7:
+            return (COUNT_LOOP, cells[1], cells[2], cells[6]), 7
+    elif instruction == 109 and len(cells) >= 4 and cells[2] == 204:
+        return (RELATIVE_LOAD, cells[1], cells[3]), 4
+    return None
+
+class FusingIntcodeProcessor(FastIntcodeProcessor):
+    '''FastIntcodeProcessor that decodes per address instead of per instruction word, and executes common two
+    instruction idioms as one superinstruction. Whatever was decoded at an address is dropped again as soon as
+    anything writes to one of the cells it was decoded from.'''
+    def __init__(self, program, input = []):
+        super(FusingIntcodeProcessor, self).__init__(program, input)
+        self._clear_decoded()
+
+    def reset(self, program, input = []):
+        super(FusingIntcodeProcessor, self).reset(program, input)
+        self._clear_decoded()
+
+    def fork(self, input = []):
+        child = super(FusingIntcodeProcessor, self).fork(input)
+        # the memory is the same, so everything we decoded still holds
+        child._decoded = dict(self._decoded)
+        child._covered = {address: list(starts) for address, starts in self._covered.items()}
+        return child
+
+    def _clear_decoded(self):
+        # address -> decoded instruction or superinstruction
+        self._decoded = {}
+        # address -> the addresses of what was decoded from it
+        self._covered = {}
+
+    def _decode_at(self, address):
+        fused = fuse(self.state.memory, address)
+        decoded, cells = fused if fused is not None else (decode(self.state.memory[address]), 1)
+        self._decoded[address] = decoded
+        for cell in range(address, address + cells):
+            self._covered.setdefault(cell, []).append(address)
+        return decoded
+
+    def _written(self, address):
+        for start in self._covered.pop(address):
+            self._decoded.pop(start, None)
+
+    def _run(self, max_steps = None):
+        state = self.state
+        memory = state.memory
+        ip = state.instruction_pointer
+        rb = state.relative_base
+        steps = state.steps
+        dirty = state.dirty
+        stop_at = None if max_steps is None else steps + max_steps
+        decoded_at = self._decoded
+        covered = self._covered
+        try:
+            while steps != stop_at:
+                decoded = decoded_at.get(ip) or self._decode_at(ip)
+                opcode = decoded[0]
+                if opcode > 100:
+                    # a superinstruction counts as two steps, so it has to fit in what is left of max_steps
+                    if stop_at is None or stop_at - steps >= 2:
+                        if opcode == COMPARE_BRANCH:
+                            _, a, k, t, less_than, jump_if_true, target = decoded
+                            condition = memory[a] < k if less_than else memory[a] == k
+                            memory[t] = 1 if condition else 0
+                            if dirty is not None:
+                                dirty.add(t >> PAGE_BITS)
+                            if t in covered:
+                                self._written(t)
+                            ip = target if condition == jump_if_true else ip + 7
+                            steps += 2
+                        elif opcode == COUNT_LOOP:
+                            _, x, k, target = decoded
+                            memory[x] += k
+                            if dirty is not None:
+                                dirty.add(x >> PAGE_BITS)
+                            if x in covered:
+                                self._written(x)
+                            ip = target if memory[x] != 0 else ip + 7
+                            steps += 2
+                        else:
+                            _, d, offset = decoded
+                            # count the adjustment first, like the reference does when the load fails
+                            rb += d
+                            steps += 1
+                            state.output.append(memory[rb + offset])
+                            ip += 4
+                            steps += 1
+                        continue
+                    decoded = decode(memory[ip])
+                    opcode = decoded[0]
+
+                _, mode1, mode2, mode3 = decoded
+                if opcode == 99:
+                    return 'HALT'
+
+                if opcode == 9 or opcode == 4:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    if opcode == 9:
+                        rb += a
+                    else:
+                        state.output.append(a)
+                    ip += 2
+                elif opcode == 3:
+                    if not state.input:
+                        return 'INPUT'
+                    assert mode1 != 1, "Unsupported parameter mode for storing: 1"
+                    p = memory[ip + 1]
+                    if mode1 == 2:
+                        p += rb
+                    memory[p] = state.input[0]
+                    if dirty is not None:
+                        dirty.add(p >> PAGE_BITS)
+                    if p in covered:
+                        self._written(p)
+                    state.input = state.input[1:]
+                    ip += 2
+                else:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    p = memory[ip + 2]
+                    b = memory[p] if mode2 == 0 else p if mode2 == 1 else memory[rb + p]
+                    if opcode == 5:
+                        ip = b if a != 0 else ip + 3
+                    elif opcode == 6:
+                        ip = b if a == 0 else ip + 3
+                    else:
+                        assert mode3 != 1, "Unsupported parameter mode for storing: 1"
+                        p = memory[ip + 3]
+                        if mode3 == 2:
+                            p += rb
+                        if opcode == 1:
+                            memory[p] = a + b
+                        elif opcode == 2:
+                            memory[p] = a * b
+                        elif opcode == 7:
+                            memory[p] = 1 if a < b else 0
+                        else:
+                            memory[p] = 1 if a == b else 0
+                        if dirty is not None:
+                            dirty.add(p >> PAGE_BITS)
+                        if p in covered:
+                            self._written(p)
+                        ip += 4
+                steps += 1
+            return 'PREEMPTED'
+        finally:
+            state.instruction_pointer = ip
+            state.relative_base = rb
+            state.steps = steps
+
+class FastIntcodeProcessorTests(unittest.TestCase):
+    def run_program(self, program, input = []):
+        proc = FastIntcodeProcessor(program + [0] * 10**3, input)
+        self.assertEqual(proc.Process(), 'HALT')
+        return proc
+
+    def test_day2_unittests(self):
+        self.assertEqual(self.run_program([1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50]).state.memory[:12],
+                         [3500, 9, 10, 70, 2, 3, 11, 0, 99, 30, 40, 50])
+        self.assertEqual(self.run_program([1, 1, 1, 4, 99, 5, 6, 0, 99]).state.memory[:9], [30, 1, 1, 4, 2, 5, 6, 0, 99])
+
+    def test_day5(self):
+        with open('../day5/input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')]
+        self.assertEqual(self.run_program([n for n in memory], [5]).state.output, [5893654])
+
+    def test_day9(self):
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')]
+        self.assertEqual(self.run_program([n for n in memory], [1]).state.output, [2890527621])
+        quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+        self.assertEqual(self.run_program(quine).state.output, quine)
+
+    def test_max_steps(self):
+        proc = FastIntcodeProcessor([1001, 7, 1, 7, 1105, 1, 0, 0])
+        self.assertEqual(proc.Process(max_steps=10), 'PREEMPTED')
+        self.assertEqual((proc.state.steps, proc.state.memory[7]), (10, 5))
+
+    def test_fuse(self):
+        self.assertEqual(fuse([1008, 20, 3, 21, 1005, 21, 0], 0), ((COMPARE_BRANCH, 20, 3, 21, False, True, 0), 7))
+        self.assertEqual(fuse([1001, 20, -1, 20, 1005, 20, 0], 0), ((COUNT_LOOP, 20, -1, 0), 7))
+        self.assertEqual(fuse([109, 5, 204, -1], 0), ((RELATIVE_LOAD, 5, -1), 4))
+        # the branch doesn't test what the compare wrote
+        self.assertIsNone(fuse([1008, 20, 3, 21, 1005, 22, 0], 0))
+        # the compare writes into the branch
+        self.assertIsNone(fuse([1008, 20, 3, 6, 1005, 6, 0], 0))
+
+    def test_fusing_day9(self):
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')]
+        proc = FusingIntcodeProcessor(memory + [0] * 10**3, [1])
+        self.assertEqual(proc.Process(), 'HALT')
+        self.assertEqual(proc.state.output, [2890527621])
+        reference = IntcodeProcessor(memory + [0] * 10**3, [1])
+        reference.Process()
+        self.assertEqual(proc.state.steps, reference.state.steps)
+        self.assertTrue(any(decoded[0] > 100 for decoded in proc._decoded.values()))
+
+    def test_fusing_self_modifying(self):
+        # counts memory[20] down to zero, but every time round the loop the decrement gets patched to -2
+        program = [1001, 20, -1, 20, 1005, 20, 8, 99, 1101, 0, -2, 2, 1105, 1, 0, 0, 0, 0, 0, 0, 11]
+        reference = IntcodeProcessor([n for n in program])
+        fused = FusingIntcodeProcessor([n for n in program])
+        for proc in (reference, fused):
+            self.assertEqual(proc.Process(), 'HALT')
+        self.assertEqual(fused.state.memory, reference.state.memory)
+        self.assertEqual(fused.state.steps, reference.state.steps)
+
+    def test_loop_detector(self):
+        for engine in (FastIntcodeProcessor, FusingIntcodeProcessor):
+            proc = engine([1002, 11, -1, 11, 1001, 11, 1, 11, 1105, 1, 0, 0])
+            self.assertEqual(proc.Process(quantum=10, detector=LoopDetector(7)), 'LOOP')
+
+    def test_run_with_inputs(self):
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')] + [0] * 10**3
+        for engine in (FastIntcodeProcessor, FusingIntcodeProcessor):
+            self.assertEqual(run_with_inputs(memory, [[1], [2]], engine), [('HALT', [2890527621]), ('HALT', [66772])])
+
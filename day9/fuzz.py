@@ -0,0 +1,184 @@
+'''Differential fuzzing of the Intcode engines. We generate random valid programs, run them on every engine and check
+that they all end up in exactly the same state, while keeping track of how fast every engine is compared to the
+reference Instruction classes.
+
+The programs are built from blocks of straight line code. Every block can move the relative base and moves it back
+before it ends, and jumps only go to the start of a block, so relative addressing always stays inside the data area.
+Besides the data area, writes can also go to the immediate operands of other instructions (self modifying code).'''
+import argparse
+import random
+import time
+import unittest
+from day9 import IntcodeProcessor
+from fastprocessor import FastIntcodeProcessor, FusingIntcodeProcessor
+
+ENGINES = {'reference': IntcodeProcessor, 'fast': FastIntcodeProcessor, 'fused': FusingIntcodeProcessor}
+
+DATA_SIZE = 32
+BIG_VALUES = [2**63 - 1, -2**63, 2**64 + 7, -3 * 2**70, 10**30]
+
+class Generator:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def constant(self):
+        if self.rng.random() < 0.1:
+            return self.rng.choice(BIG_VALUES)
+        return self.rng.randint(-20, 20)
+
+    def read(self, relative):
+        '''A parameter and its mode for reading'''
+        kind = self.rng.choice(['position', 'immediate', 'relative'] if relative else ['position', 'immediate'])
+        if kind == 'position':
+            return ('data', self.rng.randrange(DATA_SIZE)), 0
+        if kind == 'immediate':
+            return ('patchable', self.constant()), 1
+        return self.rng.randrange(DATA_SIZE // 2), 2
+
+    def write(self, relative):
+        '''A parameter and its mode for writing'''
+        if relative and self.rng.random() < 0.3:
+            return self.rng.randrange(DATA_SIZE // 2), 2
+        if self.rng.random() < 0.15:
+            return ('patch',), 0
+        return ('data', self.rng.randrange(DATA_SIZE)), 0
+
+    def instruction(self, relative):
+        kind = self.rng.choice(['add', 'mul', 'lt', 'eq', 'in', 'out'])
+        if kind in ('add', 'lt', 'eq'):
+            (a, mode1), (b, mode2), (c, mode3) = self.read(relative), self.read(relative), self.write(relative)
+            return [{'add': 1, 'lt': 7, 'eq': 8}[kind] + 100 * mode1 + 1000 * mode2 + 10000 * mode3, a, b, c]
+        if kind == 'mul':
+            # the second factor is always a constant nobody writes to, otherwise values could square every loop
+            (a, mode1), (c, mode3) = self.read(relative), self.write(relative)
+            return [2 + 100 * mode1 + 1000 + 10000 * mode3, a, self.rng.choice([-3, -1, 2, 3, 2**40]), c]
+        if kind == 'in':
+            a, mode = self.write(relative)
+            return [3 + 100 * mode, a]
+        a, mode = self.read(relative)
+        return [4 + 100 * mode, a]
+
+    def block(self, index, blocks):
+        code = []
+        shift = self.rng.randrange(DATA_SIZE // 4) if self.rng.random() < 0.5 else 0
+        if shift:
+            code += [109, shift]
+        for _ in range(self.rng.randint(1, 6)):
+            code += self.instruction(shift != 0)
+        if shift:
+            code += [109, -shift]
+
+        ending = self.rng.choice(['fall through', 'jump', 'loop', 'compare'])
+        target = ('block', self.rng.randrange(blocks))
+        if ending == 'jump':
+            code += [1105, 1, ('block', self.rng.randrange(index + 1, blocks + 1))]
+        elif ending == 'loop':
+            counter = ('data', self.rng.randrange(DATA_SIZE))
+            code += [1001, counter, -1, counter, 1005, counter, ('block', self.rng.randrange(index + 1))]
+        elif ending == 'compare':
+            a, flag = ('data', self.rng.randrange(DATA_SIZE)), ('data', self.rng.randrange(DATA_SIZE))
+            code += [self.rng.choice([1007, 1008]), a, ('patchable', self.constant()), flag, self.rng.choice([1005, 1006]), flag, target]
+        return code
+
+    def program(self):
+        '''Returns a program and the inputs for it'''
+        count = self.rng.randint(2, 8)
+        blocks = [self.block(n, count) for n in range(count)]
+        # resolve jumps to blocks that don't exist to the halt at the end
+        starts = [2]
+        for block in blocks:
+            starts.append(starts[-1] + len(block))
+        code_size = starts[-1] + 1
+        code = [109, code_size] + [cell for block in blocks for cell in block] + [99]
+
+        patchable = [address for address, cell in enumerate(code) if isinstance(cell, tuple) and cell[0] == 'patchable']
+        program = []
+        for cell in code:
+            if isinstance(cell, tuple):
+                if cell[0] == 'data':
+                    cell = code_size + cell[1]
+                elif cell[0] == 'patchable':
+                    cell = cell[1]
+                elif cell[0] == 'block':
+                    cell = starts[min(cell[1], len(blocks))]
+                else:
+                    cell = self.rng.choice(patchable) if patchable else code_size
+            program.append(cell)
+        program += [self.constant() for _ in range(DATA_SIZE)]
+        return program, [self.constant() for _ in range(self.rng.randint(50, 200))]
+
+def run_engine(engine, program, input, max_steps):
+    '''Returns the final state of the machine and the time it took'''
+    processor = engine([n for n in program], [n for n in input])
+    start = time.perf_counter()
+    try:
+        status = processor.Process(max_steps=max_steps)
+    except (AssertionError, IndexError):
+        status = 'ERROR'
+    elapsed = time.perf_counter() - start
+    state = processor.state
+    result = {'status': status, 'memory': state.memory, 'output': state.output, 'steps': state.steps}
+    # when an instruction fails halfway the engines don't need to agree on where the instruction pointer is
+    if status != 'ERROR':
+        result['instruction_pointer'] = state.instruction_pointer
+        result['relative_base'] = state.relative_base
+    return result, elapsed
+
+def fuzz(count, seed = 0, max_steps = 2000, engines = ENGINES, report_every = None):
+    '''Runs count random programs on all engines. Returns the mismatches and the total time and steps per engine'''
+    rng = random.Random(seed)
+    generator = Generator(rng)
+    mismatches = []
+    times = {name: 0.0 for name in engines}
+    steps = {name: 0 for name in engines}
+    for n in range(count):
+        program, input = generator.program()
+        results = {}
+        for name, engine in engines.items():
+            results[name], elapsed = run_engine(engine, program, input, max_steps)
+            times[name] += elapsed
+            steps[name] += results[name]['steps']
+        reference = results['reference']
+        for name, result in results.items():
+            if result != reference:
+                mismatches.append((program, input, name, result, reference))
+        if report_every and (n + 1) % report_every == 0:
+            print(F"{n + 1} programs, {len(mismatches)} mismatches, " + report(times, steps))
+    return mismatches, times, steps
+
+def report(times, steps):
+    rates = {name: steps[name] / times[name] if times[name] else 0 for name in times}
+    return ', '.join(F"{name}: {rate:,.0f} steps/s ({rate / rates['reference'] if rates['reference'] else 0:.2f}x)" for name, rate in rates.items())
+
+class FuzzTests(unittest.TestCase):
+    def test_generator(self):
+        program, input = Generator(random.Random(1)).program()
+        result, _ = run_engine(IntcodeProcessor, program, input, 2000)
+        self.assertNotEqual(result['steps'], 0)
+
+    def test_engines_agree(self):
+        mismatches, times, steps = fuzz(100, seed=2019, max_steps=500)
+        self.assertEqual(mismatches, [])
+        self.assertGreater(steps['reference'], 0)
+
+    def test_finds_mismatch(self):
+        class BrokenProcessor(FastIntcodeProcessor):
+            def Process(self, max_steps = None):
+                try:
+                    return super(BrokenProcessor, self).Process(max_steps)
+                finally:
+                    self.state.memory[-1] += 1
+
+        mismatches, _, _ = fuzz(1, engines={'reference': IntcodeProcessor, 'broken': BrokenProcessor})
+        self.assertEqual(len(mismatches), 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Differential fuzzing of the Intcode engines")
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-steps', type=int, default=10000)
+    args = parser.parse_args()
+    mismatches, times, steps = fuzz(args.count, args.seed, args.max_steps, report_every=max(1, args.count // 10))
+    for program, input, name, result, reference in mismatches[:5]:
+        print(F"{name} does not match the reference for program {program} with input {input}")
+    print(F"{len(mismatches)} mismatches, " + report(times, steps))
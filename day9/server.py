@@ -0,0 +1,327 @@
+'''A local Intcode execution service. Programs are parsed once and cached, jobs run on a pool of worker processes that
+stay warm between jobs, and the outputs of a job are streamed back while it is still running.
+
+POST /programs with a comma separated program returns {"program": <id>}.
+POST /run with {"program": <id> or "source": "1,2,3,...", "input": [...], "max_steps": n, "memory": n} streams one
+json object per line: {"output": [...]} while running and {"status": ..., "steps": ...} when done. The status is
+HALT, INPUT when the program needs more input, PREEMPTED after max_steps, LOOP when the program got stuck in a loop
+that can never end, or ERROR, in which case there is also an "error" with what went wrong.
+
+The workers run the fast engine by default. It keeps its decoded instructions in a per process cache, so they stay
+warm from one job to the next.'''
+import argparse
+import collections
+import hashlib
+import http.client
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from day9 import IntcodeProcessor, LoopDetector, ProcessorPool
+from fastprocessor import FastIntcodeProcessor, FusingIntcodeProcessor
+
+ENGINES = {'reference': IntcodeProcessor, 'fast': FastIntcodeProcessor, 'fused': FusingIntcodeProcessor}
+
+# every worker reports the outputs so far after this many instructions
+SLICE_STEPS = 10**5
+# extra zeroed memory after the program, like day9 gives its programs
+EXTRA_MEMORY = 10**3
+# how many padded program images every worker keeps
+IMAGES = 16
+
+def parse_program(source):
+    return [int(n) for n in source.strip().split(',')]
+
+def program_id(program):
+    return hashlib.sha256(','.join(str(n) for n in program).encode('ascii')).hexdigest()
+
+def padded_image(images, programs, id, memory):
+    '''The program followed by memory zeroed cells, built once per program and memory size. Jobs never write to it,
+    acquire copies it into the memory of a pooled processor'''
+    key = (id, memory)
+    image = images.get(key)
+    if image is None:
+        image = images[key] = programs[id] + [0] * memory
+        if len(images) > IMAGES:
+            images.popitem(last=False)
+    images.move_to_end(key)
+    return image
+
+def _worker(jobs, results, engine):
+    programs = {}
+    images = collections.OrderedDict()
+    pool = ProcessorPool(ENGINES[engine])
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, id, program, input, max_steps, memory = job
+        processor = None
+        try:
+            if program is not None:
+                programs[id] = program
+            processor = pool.acquire(padded_image(images, programs, id, memory), input)
+            # a program that is stuck in a loop would otherwise keep this worker busy until max_steps, or forever
+            detector = LoopDetector()
+            status = 'PREEMPTED'
+            sent = 0
+            while status == 'PREEMPTED' and (max_steps is None or processor.state.steps < max_steps):
+                budget = SLICE_STEPS if max_steps is None else min(SLICE_STEPS, max_steps - processor.state.steps)
+                status = processor.Process(max_steps=budget, detector=detector)
+                if len(processor.state.output) > sent:
+                    results.put(('output', job_id, processor.state.output[sent:]))
+                    sent = len(processor.state.output)
+            results.put(('done', job_id, status, processor.state.steps, None))
+            pool.release([processor])
+        except Exception as e:
+            results.put(('done', job_id, 'ERROR', 0 if processor is None else processor.state.steps, repr(e)))
+
+class IntcodeServer:
+    def __init__(self, host = 'localhost', port = 8019, workers = multiprocessing.cpu_count(), engine = 'fast'):
+        assert engine in ENGINES, F"Unknown engine {engine}"
+        self.programs = {}
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._results = multiprocessing.Queue()
+        self._workers = []
+        for _ in range(workers):
+            jobs = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_worker, args=(jobs, self._results, engine), daemon=True)
+            process.start()
+            # the programs this worker already has, so we only send them once
+            self._workers.append((process, jobs, set(), [0]))
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self.http = ThreadingHTTPServer((host, port), self._handler())
+
+    def add_program(self, source):
+        program = parse_program(source)
+        id = program_id(program)
+        with self._lock:
+            self.programs.setdefault(id, program)
+        return id
+
+    def submit(self, id, input = [], max_steps = None, memory = EXTRA_MEMORY):
+        '''Starts a job and returns a queue that receives its results'''
+        with self._lock:
+            assert id in self.programs, F"Unknown program {id}"
+            job_id = next(self._job_ids)
+            # the worker with the fewest running jobs gets it
+            process, jobs, known, running = min(self._workers, key=lambda worker: worker[3][0])
+            running[0] += 1
+            results = queue.Queue()
+            self._jobs[job_id] = (results, running)
+            program = None if id in known else self.programs[id]
+            known.add(id)
+        jobs.put((job_id, id, program, list(input), max_steps, memory))
+        return job_id, results
+
+    def _dispatch(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            with self._lock:
+                results, running = self._jobs[result[1]]
+                if result[0] == 'done':
+                    running[0] -= 1
+                    del self._jobs[result[1]]
+            results.put(result)
+
+    def run(self, id, input = [], max_steps = None, memory = EXTRA_MEMORY):
+        '''Starts a job, returns a generator that yields ('output', values) while the job runs and finally
+        ('done', status, steps, error), where error is None unless the status is ERROR'''
+        job_id, results = self.submit(id, input, max_steps, memory)
+        return self._results_of(results)
+
+    def _results_of(self, results):
+        while True:
+            result = results.get()
+            if result[0] == 'output':
+                yield 'output', result[2]
+            else:
+                yield 'done', result[2], result[3], result[4]
+                return
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _reply(self, code, content):
+                data = (json.dumps(content) + '\n').encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, content):
+                data = (json.dumps(content) + '\n').encode('utf-8')
+                self.wfile.write(F"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                try:
+                    if self.path == '/programs':
+                        self._reply(200, {'program': server.add_program(self._body().decode('ascii'))})
+                        return
+                    if self.path != '/run':
+                        self._reply(404, {'error': F"Unknown path {self.path}"})
+                        return
+                    request = json.loads(self._body())
+                    id = server.add_program(request['source']) if 'source' in request else request['program']
+                    results = server.run(id, request.get('input', []), request.get('max_steps'), request.get('memory', EXTRA_MEMORY))
+                except Exception as e:
+                    self._reply(400, {'error': repr(e)})
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for result in results:
+                    if result[0] == 'output':
+                        self._chunk({'output': result[1]})
+                    elif result[3] is None:
+                        self._chunk({'status': result[1], 'steps': result[2]})
+                    else:
+                        self._chunk({'status': result[1], 'steps': result[2], 'error': result[3]})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def serve_forever(self):
+        self.http.serve_forever()
+
+    def shutdown(self):
+        self.http.shutdown()
+        self.http.server_close()
+        for process, jobs, known, running in self._workers:
+            jobs.put(None)
+        for process, jobs, known, running in self._workers:
+            process.join()
+        self._results.put(None)
+        self._dispatcher.join()
+
+def run_remote(host, port, input = [], max_steps = None, program = None, source = None):
+    '''Client side of /run. Yields the outputs as they come in and returns (status, steps). Raises a RuntimeError
+    when the job failed'''
+    request = {'input': input, 'max_steps': max_steps}
+    if source is not None:
+        request['source'] = source
+    else:
+        request['program'] = program
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('POST', '/run', json.dumps(request), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    assert response.status == 200, response.read().decode('utf-8')
+    for line in response:
+        result = json.loads(line)
+        if 'output' in result:
+            yield from result['output']
+        else:
+            connection.close()
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            return result['status'], result['steps']
+
+class IntcodeServerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = IntcodeServer(port=0, workers=2)
+        cls.port = cls.server.http.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def collect(self, results):
+        outputs = []
+        while True:
+            try:
+                outputs.append(next(results))
+            except StopIteration as done:
+                return outputs, done.value
+
+    def test_day9_puzzle1(self):
+        with open('input.txt') as f:
+            source = f.read()
+        outputs, (status, steps) = self.collect(run_remote('localhost', self.port, [1], source=source))
+        self.assertEqual(outputs, [2890527621])
+        self.assertEqual(status, 'HALT')
+        # the second run uses the cached program
+        id = self.server.add_program(source)
+        outputs, _ = self.collect(run_remote('localhost', self.port, [1], program=id))
+        self.assertEqual(outputs, [2890527621])
+
+    def test_max_steps(self):
+        # outputs 0, 1, 2, ... forever
+        outputs, (status, steps) = self.collect(run_remote('localhost', self.port, max_steps=30, source="4,9,1001,9,1,9,1105,1,0,0"))
+        self.assertEqual(outputs, list(range(10)))
+        self.assertEqual((status, steps), ('PREEMPTED', 30))
+
+    def test_error(self):
+        with self.assertRaisesRegex(RuntimeError, 'opcode 98'):
+            self.collect(run_remote('localhost', self.port, source="98,0,99"))
+        results = list(self.server.run(self.server.add_program("1101,1,1,5,98,0")))
+        self.assertEqual(results[-1][:3], ('done', 'ERROR', 1))
+        self.assertIn('opcode 98', results[-1][3])
+
+    def test_engines(self):
+        with open('input.txt') as f:
+            id = self.server.add_program(f.read())
+        self.assertEqual(list(self.server.run(id, [2])), [('output', [66772]), ('done', 'HALT', 371205, None)])
+        server = IntcodeServer(port=0, workers=1, engine='reference')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            self.assertEqual(list(server.run(server.add_program("104,5,99"))), [('output', [5]), ('done', 'HALT', 1, None)])
+        finally:
+            server.shutdown()
+
+    def test_padded_image(self):
+        images = collections.OrderedDict()
+        programs = {'a': [104, 1, 99], 'b': [99]}
+        image = padded_image(images, programs, 'a', 2)
+        self.assertEqual(image, [104, 1, 99, 0, 0])
+        self.assertIs(padded_image(images, programs, 'a', 2), image)
+        self.assertEqual(padded_image(images, programs, 'a', 0), [104, 1, 99])
+        for memory in range(IMAGES):
+            padded_image(images, programs, 'b', memory)
+        self.assertEqual(len(images), IMAGES)
+        self.assertNotIn(('a', 2), images)
+
+    def test_loop(self):
+        outputs, (status, steps) = self.collect(run_remote('localhost', self.port, source="104,7,1105,1,2"))
+        self.assertEqual((outputs, status), ([7], 'LOOP'))
+
+    def test_needs_input(self):
+        outputs, (status, steps) = self.collect(run_remote('localhost', self.port, source="4,0,3,0,99"))
+        self.assertEqual((outputs, status, steps), ([4], 'INPUT', 1))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Intcode execution service")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8019)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--engine', default='fast', choices=list(ENGINES))
+    args = parser.parse_args()
+    server = IntcodeServer(args.host, args.port, args.workers, args.engine)
+    print(F"Serving Intcode jobs on http://{args.host}:{server.http.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,381 @@
+'''Execution traces for Intcode programs. TracingIntcodeProcessor is FastIntcodeProcessor with one record per
+instruction: the step, the instruction pointer, the opcode, the two operands it read and the address and value it
+wrote (-1 and 0 when it didn't write anything, or the new relative base for opcode 9).
+
+The engine only appends a tuple per instruction, and hands them over a block of BLOCK_RECORDS at a time. Blocks are
+packed into 64 bit integers a whole block at once, when they're written or saved. They go into a RingBuffer, which
+keeps the last N instructions and can be saved when a run halts or fails, or straight into a gzip compressed
+TraceFile. Both write the same file format: a header and then the blocks. Values that don't fit in 64 bits are
+clipped, and the flags say which ones were.
+
+    python trace.py record program.txt --input 1 --window 10000 -o trace.gz
+    python trace.py query trace.gz --address 1000 --last 20
+    python trace.py summary trace.gz'''
+import argparse
+import collections
+import gzip
+import itertools
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from array import array
+from day9 import PAGE_BITS, IntcodeProcessor
+from fastprocessor import DECODED, FastIntcodeProcessor, decode
+
+MAGIC = b'ICTR\x02\x00\x00\x00'
+# every block starts with the step of its first record, the number of records and the number of fields per record
+BLOCK = struct.Struct('<qqq')
+# what the engine records per instruction. Blocks with values that don't fit in 64 bits have flags after the opcode
+FIELDS = ('pc', 'opcode', 'a', 'b', 'address', 'value')
+Record = collections.namedtuple('Record', 'step pc opcode flags a b address value')
+# the fields we clip to 64 bits, with their flag
+CLIPPED = {'a': 1, 'b': 2, 'address': 4, 'value': 8}
+# the engine hands its records to the tracer this many at a time
+BLOCK_RECORDS = 1 << 12
+
+LIMIT = 2**63 - 1
+
+def encode_block(records):
+    '''Packs a list of (pc, opcode, a, b, address, value) tuples into one array. Returns the fields per record and
+    the array'''
+    try:
+        return len(FIELDS), array('q', itertools.chain.from_iterable(records))
+    except OverflowError:
+        values = array('q')
+        for pc, opcode, *fields in records:
+            flags = 0
+            for n, name in enumerate(CLIPPED):
+                if not -LIMIT - 1 <= fields[n] <= LIMIT:
+                    flags |= CLIPPED[name]
+                    fields[n] = max(-LIMIT - 1, min(LIMIT, fields[n]))
+            values.extend([pc, opcode, flags] + fields)
+        return len(FIELDS) + 1, values
+
+def decode_block(first, width, values):
+    for n in range(len(values) // width):
+        fields = values[n * width : (n + 1) * width]
+        if width == len(FIELDS):
+            yield Record(first + n, fields[0], fields[1], 0, *fields[2:])
+        else:
+            yield Record(first + n, *fields)
+
+def write_block(f, first, width, values):
+    f.write(BLOCK.pack(first, len(values) // width, width))
+    if sys.byteorder == 'big':
+        values = array('q', values)
+        values.byteswap()
+    f.write(values.tobytes())
+
+class RingBuffer:
+    '''Keeps (at least) the last capacity records, a block at a time. Most blocks get dropped without anyone looking at
+    them, so we only pack the ones we still have when they're saved or read'''
+    def __init__(self, capacity = 1 << 16):
+        self.capacity = capacity
+        self.count = 0
+        self._blocks = collections.deque()
+        self._kept = 0
+
+    def write(self, first, records):
+        self._blocks.append((first, records))
+        self.count += len(records)
+        self._kept += len(records)
+        # drop the oldest blocks, as long as we keep enough records without them
+        while self._kept - len(self._blocks[0][1]) >= self.capacity:
+            self._kept -= len(self._blocks.popleft()[1])
+
+    def _window(self):
+        '''The packed blocks with only the last capacity records'''
+        skip = max(0, self._kept - self.capacity)
+        for first, records in self._blocks:
+            if skip >= len(records):
+                skip -= len(records)
+                continue
+            yield (first + skip,) + encode_block(records[skip:])
+            skip = 0
+
+    def records(self):
+        '''The records we still have, oldest first'''
+        for first, width, values in self._window():
+            yield from decode_block(first, width, values)
+
+    def save(self, path):
+        with gzip.open(path, 'wb') as f:
+            f.write(MAGIC)
+            for first, width, values in self._window():
+                write_block(f, first, width, values)
+
+    def close(self):
+        pass
+
+class TraceFile:
+    '''Writes every block to a gzip compressed file as it comes in'''
+    def __init__(self, path):
+        self.count = 0
+        self._file = gzip.open(path, 'wb', compresslevel=1)
+        self._file.write(MAGIC)
+
+    def write(self, first, records):
+        write_block(self._file, first, *encode_block(records))
+        self.count += len(records)
+
+    def close(self):
+        self._file.close()
+
+def read_trace(path):
+    with gzip.open(path, 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC, F"{path} is not an Intcode trace"
+        while True:
+            header = f.read(BLOCK.size)
+            if not header:
+                return
+            first, count, width = BLOCK.unpack(header)
+            values = array('q')
+            values.frombytes(f.read(count * width * values.itemsize))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            yield from decode_block(first, width, values)
+
+def query(records, pc = None, opcode = None, address = None, first = None, last_step = None):
+    '''The records that match all of the given conditions. address matches the address that was written to'''
+    for record in records:
+        if first is not None and record.step < first:
+            continue
+        if last_step is not None and record.step > last_step:
+            return
+        if pc is not None and record.pc != pc:
+            continue
+        if opcode is not None and record.opcode != opcode:
+            continue
+        if address is not None and record.address != address:
+            continue
+        yield record
+
+def summary(records):
+    '''Instructions per opcode and the most executed instruction pointers'''
+    opcodes = collections.Counter()
+    pcs = collections.Counter()
+    steps = 0
+    for record in records:
+        opcodes[record.opcode] += 1
+        pcs[record.pc] += 1
+        steps += 1
+    return steps, opcodes, pcs.most_common(10)
+
+class TracingIntcodeProcessor(FastIntcodeProcessor):
+    '''FastIntcodeProcessor that records every instruction it executes in tracer'''
+    def __init__(self, program, input = [], tracer = None):
+        super(TracingIntcodeProcessor, self).__init__(program, input)
+        self.tracer = RingBuffer() if tracer is None else tracer
+
+    def _run(self, max_steps = None):
+        state = self.state
+        memory = state.memory
+        ip = state.instruction_pointer
+        rb = state.relative_base
+        steps = state.steps
+        dirty = state.dirty
+        stop_at = None if max_steps is None else steps + max_steps
+        first = steps
+        flush_at = first + BLOCK_RECORDS
+        records = []
+        record = records.append
+        try:
+            while steps != stop_at:
+                instruction = memory[ip]
+                decoded = DECODED.get(instruction) or decode(instruction)
+                opcode, mode1, mode2, mode3 = decoded
+                if opcode == 99:
+                    return 'HALT'
+
+                if opcode == 9 or opcode == 4:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    if opcode == 9:
+                        rb += a
+                        record((ip, 9, a, 0, -1, rb))
+                    else:
+                        state.output.append(a)
+                        record((ip, 4, a, 0, -1, 0))
+                    ip += 2
+                elif opcode == 3:
+                    if not state.input:
+                        return 'INPUT'
+                    assert mode1 != 1, "Unsupported parameter mode for storing: 1"
+                    p = memory[ip + 1]
+                    if mode1 == 2:
+                        p += rb
+                    memory[p] = value = state.input[0]
+                    if dirty is not None:
+                        dirty.add(p >> PAGE_BITS)
+                    state.input = state.input[1:]
+                    record((ip, 3, value, 0, p, value))
+                    ip += 2
+                else:
+                    p = memory[ip + 1]
+                    a = memory[p] if mode1 == 0 else p if mode1 == 1 else memory[rb + p]
+                    p = memory[ip + 2]
+                    b = memory[p] if mode2 == 0 else p if mode2 == 1 else memory[rb + p]
+                    if opcode == 5 or opcode == 6:
+                        record((ip, opcode, a, b, -1, 0))
+                        ip = b if (a != 0) == (opcode == 5) else ip + 3
+                    else:
+                        assert mode3 != 1, "Unsupported parameter mode for storing: 1"
+                        p = memory[ip + 3]
+                        if mode3 == 2:
+                            p += rb
+                        if opcode == 1:
+                            value = a + b
+                        elif opcode == 2:
+                            value = a * b
+                        elif opcode == 7:
+                            value = 1 if a < b else 0
+                        else:
+                            value = 1 if a == b else 0
+                        memory[p] = value
+                        if dirty is not None:
+                            dirty.add(p >> PAGE_BITS)
+                        record((ip, opcode, a, b, p, value))
+                        ip += 4
+                steps += 1
+                if steps == flush_at:
+                    self.tracer.write(first, records)
+                    first = steps
+                    flush_at = first + BLOCK_RECORDS
+                    records = []
+                    record = records.append
+            return 'PREEMPTED'
+        finally:
+            if records:
+                self.tracer.write(first, records)
+            state.instruction_pointer = ip
+            state.relative_base = rb
+            state.steps = steps
+
+def record_run(program, input, path, window = None):
+    '''Runs program with input. With a window only the last window instructions are saved, once the program halts
+    or fails, otherwise the whole run is written to path as it happens'''
+    tracer = RingBuffer(window) if window else TraceFile(path)
+    processor = TracingIntcodeProcessor(program, input, tracer)
+    try:
+        return processor.Process()
+    finally:
+        if window:
+            tracer.save(path)
+        else:
+            tracer.close()
+
+def format_record(record):
+    clipped = ''.join(F" {name} clipped" for name, flag in CLIPPED.items() if record.flags & flag)
+    written = F" [{record.address}] = {record.value}" if record.address >= 0 else ''
+    return F"{record.step:>10} pc={record.pc:<6} op={record.opcode} a={record.a} b={record.b}{written}{clipped}"
+
+class TraceTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'trace.gz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records(self):
+        proc = TracingIntcodeProcessor([3, 9, 1001, 9, 5, 9, 4, 9, 99, 0], [37])
+        self.assertEqual(proc.Process(), 'HALT')
+        self.assertEqual(proc.state.output, [42])
+        self.assertEqual(list(proc.tracer.records()), [Record(0, 0, 3, 0, 37, 0, 9, 37),
+                                                        Record(1, 2, 1, 0, 37, 5, 9, 42),
+                                                        Record(2, 6, 4, 0, 42, 0, -1, 0)])
+
+    def test_matches_reference(self):
+        import random
+        from fuzz import Generator, run_engine
+        generator = Generator(random.Random(44))
+        for _ in range(50):
+            program, input = generator.program()
+            traced, _ = run_engine(lambda program, input: TracingIntcodeProcessor(program, input, RingBuffer(16)), program, input, 500)
+            reference, _ = run_engine(IntcodeProcessor, program, input, 500)
+            self.assertEqual(traced, reference)
+
+    def test_ring_buffer(self):
+        # counts memory[7] up forever
+        proc = TracingIntcodeProcessor([1001, 7, 1, 7, 1105, 1, 0, 0], tracer=RingBuffer(5))
+        proc.Process(max_steps=100)
+        records = list(proc.tracer.records())
+        self.assertEqual([record.step for record in records], list(range(95, 100)))
+        self.assertEqual(proc.tracer.count, 100)
+        # runs longer than a block drop the blocks they don't need any more
+        proc.Process(max_steps=3 * BLOCK_RECORDS)
+        self.assertEqual([record.step for record in proc.tracer.records()], list(range(3 * BLOCK_RECORDS + 95, 3 * BLOCK_RECORDS + 100)))
+        self.assertLessEqual(len(proc.tracer._blocks), 2)
+        proc.tracer.save(self.path)
+        self.assertEqual(list(read_trace(self.path)), list(proc.tracer.records()))
+
+    def test_clipped(self):
+        buffer = RingBuffer(1)
+        buffer.write(0, [(0, 2, 2**70, 3, 5, 3 * 2**70)])
+        record = next(buffer.records())
+        self.assertEqual((record.a, record.b, record.value, record.flags), (2**63 - 1, 3, 2**63 - 1, 1 | 8))
+        self.assertIn('value clipped', format_record(record))
+
+    def test_day9_trace_file(self):
+        with open('input.txt') as f:
+            memory = [int(n) for n in f.read().split(',')] + [0] * 10**3
+        reference = IntcodeProcessor([n for n in memory], [1])
+        reference.Process()
+        self.assertEqual(record_run(memory, [1], self.path), 'HALT')
+        records = list(read_trace(self.path))
+        self.assertEqual(len(records), reference.state.steps)
+        self.assertEqual([record.a for record in query(records, opcode=4)], [2890527621])
+        steps, opcodes, pcs = summary(records)
+        self.assertEqual(steps, reference.state.steps)
+        self.assertEqual(sum(opcodes.values()), steps)
+
+    def test_window_on_error(self):
+        # writes outside of memory after a few instructions
+        program = [1101, 1, 2, 9, 1101, 0, 0, 1000, 99, 0]
+        with self.assertRaises(IndexError):
+            record_run(program, [], self.path, window=10)
+        records = list(read_trace(self.path))
+        self.assertEqual([(record.pc, record.address, record.value) for record in records], [(0, 9, 3)])
+        self.assertEqual(list(query(records, address=9)), records)
+        self.assertEqual(list(query(records, pc=4)), [])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and query Intcode execution traces")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_command = commands.add_parser('record', help="run a program and record its trace")
+    record_command.add_argument('program')
+    record_command.add_argument('--input', type=int, nargs='*', default=[])
+    record_command.add_argument('--window', type=int, help="only keep the last WINDOW instructions")
+    record_command.add_argument('--memory', type=int, default=10**3, help="extra zeroed memory after the program")
+    record_command.add_argument('-o', '--output', default='trace.gz')
+    query_command = commands.add_parser('query', help="print the records that match")
+    query_command.add_argument('trace')
+    query_command.add_argument('--pc', type=int)
+    query_command.add_argument('--opcode', type=int)
+    query_command.add_argument('--address', type=int, help="instructions that wrote to ADDRESS")
+    query_command.add_argument('--from', dest='first', type=int, help="first step")
+    query_command.add_argument('--to', dest='last_step', type=int, help="last step")
+    query_command.add_argument('--last', type=int, help="only print the last LAST matches")
+    summary_command = commands.add_parser('summary', help="instructions per opcode and the hottest addresses")
+    summary_command.add_argument('trace')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        with open(args.program) as f:
+            program = [int(n) for n in f.read().split(',')] + [0] * args.memory
+        status = record_run(program, args.input, args.output, args.window)
+        print(F"{status}, trace written to {args.output}")
+    elif args.command == 'query':
+        matches = query(read_trace(args.trace), args.pc, args.opcode, args.address, args.first, args.last_step)
+        if args.last:
+            matches = collections.deque(matches, maxlen=args.last)
+        for record in matches:
+            print(format_record(record))
+    else:
+        steps, opcodes, pcs = summary(read_trace(args.trace))
+        print(F"{steps} instructions")
+        for opcode, count in sorted(opcodes.items()):
+            print(F"opcode {opcode:>2}: {count}")
+        print("most executed: " + ', '.join(F"{pc} ({count})" for pc, count in pcs))